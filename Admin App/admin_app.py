@@ -7,13 +7,15 @@ import streamlit as st
 from admin_auth import admin_auth_manager, require_admin_auth
 from admin_database import admin_db_manager
 from database_manager import SupabaseManager
-from timezone_utils import get_colombia_now, get_colombia_today, format_date_display
+from timezone_utils import get_colombia_now, get_colombia_today, get_colombia_today_str, format_date_display, SPANISH_DAYS_FULL
 from email_config import email_manager
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from collections import defaultdict
+from io import BytesIO
+from openpyxl import Workbook
 import time
 
 
@@ -91,6 +93,16 @@ def get_cached_search_users(search_term: str):
     """Cached user search - TTL 30 seconds"""
     return admin_db_manager.search_users_detailed(search_term)
 
+@st.cache_data(ttl=60)
+def get_cached_current_lock_code():
+    """Cached lock code - TTL 60 seconds (cleared when the admin updates it)"""
+    return admin_db_manager.get_current_lock_code()
+
+@st.cache_data(ttl=60)
+def get_cached_current_access_code():
+    """Cached access code - TTL 60 seconds (cleared when the admin updates it)"""
+    return admin_db_manager.get_current_access_code()
+
 @st.cache_data(ttl=60)
 def get_cached_dashboard_data():
     """
@@ -112,6 +124,66 @@ US_OPEN_LIGHT_BLUE = "#2478CC"
 US_OPEN_YELLOW = "#FFD400"
 
 
+# ============================================
+# EXCEL EXPORT
+# ============================================
+
+def build_export_workbook(sheets) -> tuple[bytes, dict, dict]:
+    """
+    Construir el Excel de exportación en modo write-only de openpyxl
+
+    Las filas se consumen y escriben en streaming a cada hoja, sin construir
+    DataFrames ni tener todas las filas en memoria. Si la lectura de una hoja
+    falla, esa hoja queda vacía y el resto se exporta igual.
+
+    Args:
+        sheets: Lista de (nombre_hoja, filas) donde filas es un iterable de dicts
+                con las mismas claves (se usan como encabezados)
+
+    Returns:
+        tuple: (contenido del archivo, {nombre_hoja: filas escritas},
+                {nombre_hoja: error} de las hojas que fallaron)
+    """
+    workbook = Workbook(write_only=True)
+    row_counts = {}
+    errors = {}
+
+    for sheet_name, rows in sheets:
+        row_counts[sheet_name] = 0
+        worksheet = None
+        try:
+            rows = iter(rows)
+            first_row = next(rows, None)
+            if first_row is None:
+                continue
+
+            worksheet = workbook.create_sheet(title=sheet_name)
+            headers = list(first_row.keys())
+            worksheet.append(headers)
+            worksheet.append([first_row[header] for header in headers])
+            row_counts[sheet_name] = 1
+            for row in rows:
+                worksheet.append([row[header] for header in headers])
+                row_counts[sheet_name] += 1
+        except Exception as e:
+            print(f"Error exporting sheet {sheet_name}: {e}")
+            errors[sheet_name] = e
+            row_counts[sheet_name] = 0
+            # Descartar las filas parciales: la hoja queda vacía
+            if worksheet is not None:
+                worksheet.close()
+                workbook.remove(worksheet)
+            workbook.create_sheet(title=sheet_name)
+
+    # Un libro sin hojas no se puede guardar
+    if not workbook.worksheets:
+        workbook.create_sheet(title=sheets[0][0])
+
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue(), row_counts, errors
+
+
 def setup_admin_page_config():
     """Configurar la página de administración"""
     st.set_page_config(
@@ -291,35 +363,15 @@ def show_admin_dashboard():
         if st.button("📊 Exportar", type="secondary", use_container_width=True):
             with st.spinner("📊 Generando archivo Excel..."):
                 try:
-                    # Obtener datos
-                    users_data = admin_db_manager.get_all_users_for_export()
-                    reservations_data = admin_db_manager.get_all_reservations_for_export()
-                    credits_data = admin_db_manager.get_credit_transactions_for_export()
+                    # Crear archivo Excel con múltiples hojas, leyendo los datos por páginas
+                    excel_data, row_counts, sheet_errors = build_export_workbook([
+                        ('Usuarios', admin_db_manager.iter_all_users_for_export()),
+                        ('Reservas', admin_db_manager.iter_all_reservations_for_export()),
+                        ('Créditos', admin_db_manager.iter_credit_transactions_for_export())
+                    ])
 
-                    # Crear archivo Excel
-                    from io import BytesIO
-
-                    # Crear buffer en memoria
-                    buffer = BytesIO()
-
-                    # Crear archivo Excel con múltiples hojas
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                        # Hoja de usuarios
-                        if users_data:
-                            df_users = pd.DataFrame(users_data)
-                            df_users.to_excel(writer, sheet_name='Usuarios', index=False)
-
-                        # Hoja de reservas
-                        if reservations_data:
-                            df_reservations = pd.DataFrame(reservations_data)
-                            df_reservations.to_excel(writer, sheet_name='Reservas', index=False)
-
-                        # Hoja de créditos
-                        if credits_data:
-                            df_credits = pd.DataFrame(credits_data)
-                            df_credits.to_excel(writer, sheet_name='Créditos', index=False)
-
-                    buffer.seek(0)
+                    for sheet_name, sheet_error in sheet_errors.items():
+                        st.error(f"❌ Error generando hoja {sheet_name}: {str(sheet_error)}")
 
                     # Generar nombre de archivo con fecha
                     fecha_actual = get_colombia_now().strftime('%Y%m%d_%H%M%S')
@@ -328,14 +380,14 @@ def show_admin_dashboard():
                     # Botón de descarga
                     st.download_button(
                         label="📥 Descargar Excel",
-                        data=buffer.getvalue(),
+                        data=excel_data,
                         file_name=filename,
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         type="primary"
                     )
 
                     st.success(
-                        f"✅ Archivo generado: {len(users_data)} usuarios, {len(reservations_data)} reservas, {len(credits_data)} transacciones")
+                        f"✅ Archivo generado: {row_counts['Usuarios']} usuarios, {row_counts['Reservas']} reservas, {row_counts['Créditos']} transacciones")
 
                 except Exception as e:
                     st.error(f"❌ Error generando archivo: {str(e)}")
@@ -594,8 +646,7 @@ def show_dashboard_tab():
                         """, unsafe_allow_html=True)
                     with col_peak:
                         peak_activity = activity_counts.loc[activity_counts['total_activities'].idxmax()]
-                        days_spanish = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-                        peak_day_name = days_spanish[peak_activity['time_bucket'].weekday()]
+                        peak_day_name = SPANISH_DAYS_FULL[peak_activity['time_bucket'].weekday()]
                         st.markdown(f"""
                         <div style="background: #f5f5f5; padding: 10px; border-radius: 8px; text-align: center;">
                             <span style="font-size: 1.2em; font-weight: bold;">📊 Pico</span>
@@ -680,13 +731,12 @@ def show_dashboard_tab():
 
     if any(sum(row) > 0 for row in heatmap_data):
         # Create heatmap
-        days_spanish = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
         hours = [f"{h}:00" for h in range(6, 21)]
 
         fig_heatmap = go.Figure(data=go.Heatmap(
             z=heatmap_data,
             x=hours,
-            y=days_spanish,
+            y=list(SPANISH_DAYS_FULL),
             colorscale=[
                 [0, '#f5f5f5'],      # No reservations - light gray
                 [0.25, '#c8e6c9'],   # Low - light green
@@ -715,9 +765,9 @@ def show_dashboard_tab():
         # Find busiest and least busy day
         day_totals = [sum(row) for row in heatmap_data]
         busiest_day_idx = day_totals.index(max(day_totals))
-        busiest_day = days_spanish[busiest_day_idx]
+        busiest_day = SPANISH_DAYS_FULL[busiest_day_idx]
         least_busy_day_idx = day_totals.index(min(day_totals))
-        least_busy_day = days_spanish[least_busy_day_idx]
+        least_busy_day = SPANISH_DAYS_FULL[least_busy_day_idx]
 
         # Find busiest and least busy hour
         hour_totals = [sum(heatmap_data[d][h] for d in range(7)) for h in range(15)]
@@ -977,9 +1027,6 @@ def show_dashboard_tab():
         reservations_grid = calendar_data['reservations_grid']
         maintenance_grid = calendar_data.get('maintenance_grid', {})
 
-        # Nombres de los días
-        day_names = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-
         # Horarios de la cancha (6 AM a 8 PM)
         court_hours = list(range(6, 21))
 
@@ -992,7 +1039,7 @@ def show_dashboard_tab():
 
             for i, date in enumerate(week_dates):
                 date_str = date.strftime('%Y-%m-%d')
-                day_name = day_names[i]
+                day_name = SPANISH_DAYS_FULL[i]
 
                 # Check for maintenance first (it blocks reservations)
                 maintenance = maintenance_grid.get(date_str, {}).get(hour)
@@ -1859,7 +1906,6 @@ def show_credits_management_tab():
                     st.session_state.matching_users_credits = []
 
                     # Pequeña pausa para mostrar el mensaje
-                    import time
                     time.sleep(2)
                     st.rerun()
                 else:
@@ -2103,7 +2149,7 @@ def show_config_tab():
 
     with col2:
         # MOVER LA OBTENCIÓN FUERA DEL FORMULARIO
-        current_lock_code = admin_db_manager.get_current_lock_code()
+        current_lock_code = get_cached_current_lock_code()
 
         # Card para mostrar contraseña actual - FUERA del formulario
         if current_lock_code:
@@ -2212,6 +2258,8 @@ def show_config_tab():
                             new_lock_code,
                             admin_user.get('username', 'admin')
                         )
+                    # La inserción pudo aplicarse aunque la llamada falle: no mostrar la contraseña cacheada
+                    get_cached_current_lock_code.clear()
 
                     if success:
                         st.success("✅ Contraseña actualizada exitosamente")
@@ -2262,7 +2310,7 @@ def show_config_tab():
 
     with col2:
         # Mostrar código actual
-        current_access_code = admin_db_manager.get_current_access_code()
+        current_access_code = get_cached_current_access_code()
 
         if current_access_code:
             st.markdown(f"""
@@ -2361,6 +2409,8 @@ def show_config_tab():
                             new_access_code.upper(),
                             admin_user.get('username', 'admin')
                         )
+                    # La inserción pudo aplicarse aunque la llamada falle: no mostrar el código cacheado
+                    get_cached_current_access_code.clear()
 
                     if success:
                         st.success("✅ Código de acceso actualizado exitosamente")
@@ -2689,8 +2739,7 @@ def show_maintenance_tab():
             st.success("✅ Actualizado")
 
     # Obtener mantenimientos
-    from datetime import timedelta
-    start_date = get_colombia_today().strftime('%Y-%m-%d')
+    start_date = get_colombia_today_str()
     end_date = (get_colombia_today() + timedelta(days=days_range)).strftime('%Y-%m-%d')
 
     blocked_slots = admin_db_manager.get_blocked_slots(start_date, end_date)
@@ -2701,7 +2750,6 @@ def show_maintenance_tab():
         # Mostrar cada mantenimiento
         for slot in blocked_slots:
             # Formatear fecha
-            from timezone_utils import format_date_display
             date_display = format_date_display(slot['date'])
 
             # Determinar el tipo de mantenimiento y formato de hora
@@ -2750,7 +2798,6 @@ def show_maintenance_tab():
                             )
                             if success:
                                 st.success(f"✅ {message}")
-                                import time
                                 time.sleep(1)
                                 st.rerun()
                             else:
@@ -2759,7 +2806,6 @@ def show_maintenance_tab():
                             # Eliminar slot individual
                             if admin_db_manager.remove_maintenance_slot(slot['id']):
                                 st.success("✅ Mantenimiento eliminado")
-                                import time
                                 time.sleep(1)
                                 st.rerun()
                             else:
@@ -3,18 +3,130 @@ Gestor de Base de Datos para Funciones de Administración
 VERSIÓN ACTUALIZADA con formateo de fechas y horas en zona horaria de Colombia
 """
 
-from database_manager import db_manager
-from timezone_utils import get_colombia_today, get_colombia_now, format_date_display, COLOMBIA_TZ
-from datetime import datetime, timedelta
+from database_manager import db_manager, is_missing_rpc_error
+from timezone_utils import (
+    get_colombia_today, get_colombia_today_str, get_colombia_now, format_date_display,
+    COLOMBIA_UTC_OFFSET, SPANISH_DAYS, SPANISH_DAYS_FULL, SPANISH_MONTHS
+)
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Tuple
 from email_config import email_manager
-import pytz
+import httpx
+from supabase import PostgrestAPIError
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Etiquetas en español de los tipos de transacción de créditos
+# (mantener en sincronía con el CASE de la vista credit_transactions_export_v)
+TRANSACTION_TYPE_LABELS = {
+    'admin_grant': 'Otorgado por Admin',
+    'admin_deduct': 'Deducido por Admin',
+    'reservation_use': 'Usado en Reserva',
+    'reservation_refund': 'Reembolso de Reserva'
+}
+
+# Filas por página al recorrer tablas completas para exportación
+EXPORT_PAGE_SIZE = 1000
+
+# Reintentos con backoff exponencial (1s, 2s, ... hasta 4s) para fallos de red transitorios
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 4.0
+
+# Respuestas de error transitorias que se reintentan en operaciones idempotentes:
+# 502/503/504 del gateway y los códigos de conexión de PostgREST (sin base de datos
+# disponible, caché de esquema cargando, timeout esperando una conexión del pool)
+TRANSIENT_API_ERROR_CODES = ('502', '503', '504', 'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003')
+
+def _is_transient_api_error(error: Exception) -> bool:
+    """Indicar si un APIError de PostgREST corresponde a un fallo transitorio del servidor"""
+    return isinstance(error, PostgrestAPIError) and str(error.code) in TRANSIENT_API_ERROR_CODES
+
+def _escape_like(term: str) -> str:
+    r"""
+    Escapar los comodines de LIKE para que el término se busque literalmente
+
+    PostgREST además convierte todo `*` de un filtro like/ilike en `%` y no
+    admite escaparlo, así que se elimina del término.
+
+    >>> _escape_like('50%_off')
+    '50\\%\\_off'
+    >>> _escape_like('a*b')
+    'ab'
+    >>> _escape_like('c:\\tmp')
+    'c:\\\\tmp'
+    """
+    return term.replace('*', '').replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _ilike_any_filter(columns: Tuple[str, ...], term: str) -> str:
+    """
+    Construir un filtro or_() de PostgREST: alguna columna contiene `term` (ILIKE)
+
+    El patrón va entre comillas dobles para que comas, puntos o paréntesis del
+    término no rompan la sintaxis del filtro. Con los índices pg_trgm sobre
+    users(email) y users(full_name) estas búsquedas usan Bitmap Index Scan.
+    """
+    pattern = f"%{_escape_like(term)}%"
+    quoted = '"' + pattern.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return ','.join(f'{column}.ilike.{quoted}' for column in columns)
+
+@lru_cache(maxsize=4096)
+def _utc_to_colombia_str(utc_datetime_str: str, fmt: str) -> str:
+    """
+    Convertir un timestamp UTC de Supabase a hora de Colombia con el formato dado
+
+    Cacheado por (string, formato): en listados y exportaciones se repiten
+    muchos timestamps, y así cada uno se parsea y convierte una sola vez.
+    """
+    # Limpiar el string de fecha
+    if utc_datetime_str.endswith('Z'):
+        utc_datetime_str = utc_datetime_str[:-1]
+    elif '+00:00' in utc_datetime_str:
+        utc_datetime_str = utc_datetime_str.replace('+00:00', '')
+
+    # Parsear la fecha
+    utc_dt = datetime.fromisoformat(utc_datetime_str)
+
+    # Normalizar a UTC sin tzinfo si trae otro offset
+    if utc_dt.tzinfo is not None:
+        utc_dt = utc_dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+    # Convertir a hora de Colombia con el offset fijo (sin pytz ni astimezone)
+    return (utc_dt + COLOMBIA_UTC_OFFSET).strftime(fmt)
 
 class AdminDatabaseManager:
     """Gestor de base de datos para funciones administrativas"""
 
     def __init__(self):
         self.client = db_manager.client
+        # Hilos para lanzar en paralelo consultas independientes (I/O de red)
+        self._query_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='admin-db')
+
+    def _execute_with_retry(self, query, idempotent: bool = True):
+        """
+        Ejecutar una consulta de Supabase reintentando fallos de red transitorios
+
+        Las operaciones idempotentes (lecturas, updates a un valor fijo) se
+        reintentan ante cualquier error de transporte y ante respuestas 5xx
+        transitorias (TRANSIENT_API_ERROR_CODES). Las demás (inserts, RPCs con
+        efectos) solo si la conexión no llegó a establecerse, para no aplicar
+        dos veces un cambio que el servidor sí alcanzó a procesar.
+        """
+        retry_on = (httpx.TransportError, PostgrestAPIError) if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                return query.execute()
+            except retry_on as e:
+                if isinstance(e, PostgrestAPIError) and not _is_transient_api_error(e):
+                    raise
+                if attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                delay = min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY) + random.uniform(0, 0.1)
+                print(f"[Retry] Transient error ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
 
     def _format_colombia_datetime(self, utc_datetime_str: str) -> str:
         """Convertir datetime UTC a formato Colombia DD/MM/YYYY HH:MM"""
@@ -22,24 +134,8 @@ class AdminDatabaseManager:
             if not utc_datetime_str:
                 return 'N/A'
 
-            # Limpiar el string de fecha
-            if utc_datetime_str.endswith('Z'):
-                utc_datetime_str = utc_datetime_str[:-1]
-            elif '+00:00' in utc_datetime_str:
-                utc_datetime_str = utc_datetime_str.replace('+00:00', '')
-
-            # Parsear la fecha
-            utc_dt = datetime.fromisoformat(utc_datetime_str)
-
-            # Asegurar que tenga timezone UTC
-            if utc_dt.tzinfo is None:
-                utc_dt = pytz.UTC.localize(utc_dt)
-
-            # Convertir a zona horaria de Colombia
-            colombia_dt = utc_dt.astimezone(COLOMBIA_TZ)
-
             # Formatear como "DD/MM/YYYY HH:MM"
-            return colombia_dt.strftime('%d/%m/%Y %H:%M')
+            return _utc_to_colombia_str(utc_datetime_str, '%d/%m/%Y %H:%M')
 
         except Exception as e:
             print(f"Error formatting datetime: {e}")
@@ -52,24 +148,8 @@ class AdminDatabaseManager:
             if not utc_datetime_str:
                 return 'N/A'
 
-            # Limpiar el string de fecha
-            if utc_datetime_str.endswith('Z'):
-                utc_datetime_str = utc_datetime_str[:-1]
-            elif '+00:00' in utc_datetime_str:
-                utc_datetime_str = utc_datetime_str.replace('+00:00', '')
-
-            # Parsear la fecha
-            utc_dt = datetime.fromisoformat(utc_datetime_str)
-
-            # Asegurar que tenga timezone UTC
-            if utc_dt.tzinfo is None:
-                utc_dt = pytz.UTC.localize(utc_dt)
-
-            # Convertir a zona horaria de Colombia
-            colombia_dt = utc_dt.astimezone(COLOMBIA_TZ)
-
             # Formatear como "DD/MM/YYYY"
-            return colombia_dt.strftime('%d/%m/%Y')
+            return _utc_to_colombia_str(utc_datetime_str, '%d/%m/%Y')
 
         except Exception as e:
             print(f"Error formatting date: {e}")
@@ -79,77 +159,7 @@ class AdminDatabaseManager:
     def get_system_statistics(self) -> Dict:
         """Obtener estadísticas generales del sistema"""
         try:
-            # Usuarios totales y VIP
-            users_result = self.client.table('users').select('id, is_vip, credits, profile_completed').execute()
-            total_users = len(users_result.data)
-            vip_users = len([u for u in users_result.data if u.get('is_vip', False)])
-            completed_profiles = len([u for u in users_result.data if u.get('profile_completed', False)])
-            profile_completed_pct = round((completed_profiles / max(total_users, 1)) * 100, 1)
-
-            # Fechas
-            today = get_colombia_today()
-            today_str = today.strftime('%Y-%m-%d')
-
-            # Reservas de hoy
-            reservations_today = self.client.table('reservations').select('id').eq('date', today_str).execute()
-            today_reservations_count = len(reservations_today.data)
-
-            # Tasa de ocupación hoy
-            # Slots disponibles = 15 horas (6-20) menos slots bloqueados
-            blocked_today = self.client.table('blocked_slots').select('id').eq('date', today_str).execute()
-            available_slots = 15 - len(blocked_today.data)
-            today_occupancy_rate = round((today_reservations_count / max(available_slots, 1)) * 100, 1)
-
-            # Total reservas (histórico)
-            all_reservations = self.client.table('reservations').select('id, user_id').execute()
-            total_reservations = len(all_reservations.data)
-
-            # Reservas esta semana (Lunes a Domingo)
-            days_since_monday = today.weekday()
-            week_start = today - timedelta(days=days_since_monday)
-            week_end = week_start + timedelta(days=6)
-            week_start_str = week_start.strftime('%Y-%m-%d')
-            week_end_str = week_end.strftime('%Y-%m-%d')
-
-            week_reservations = self.client.table('reservations').select('id').gte(
-                'date', week_start_str
-            ).lte('date', week_end_str).execute()
-            week_reservations_count = len(week_reservations.data)
-
-            # Usuarios activos (últimos 30 días)
-            thirty_days_ago = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-            active_users_ids = set([r['user_id'] for r in all_reservations.data
-                                    if r.get('user_id')])
-            # Filter by date - need to get reservations with dates
-            active_reservations = self.client.table('reservations').select('user_id').gte(
-                'date', thirty_days_ago
-            ).execute()
-            active_users_30d = len(set([r['user_id'] for r in active_reservations.data]))
-
-            # Créditos totales emitidos (histórico)
-            try:
-                credits_issued_result = self.client.table('credit_transactions').select('amount').eq(
-                    'transaction_type', 'admin_grant'
-                ).execute()
-                total_credits_issued = sum([t['amount'] for t in credits_issued_result.data]) if credits_issued_result.data else 0
-            except Exception:
-                total_credits_issued = 0
-
-            # Créditos en sistema (balance actual de usuarios)
-            total_credits_balance = sum([u['credits'] or 0 for u in users_result.data])
-
-            return {
-                'total_users': total_users,
-                'vip_users': vip_users,
-                'active_users_30d': active_users_30d,
-                'total_reservations': total_reservations,
-                'week_reservations': week_reservations_count,
-                'today_reservations': today_reservations_count,
-                'today_occupancy_rate': today_occupancy_rate,
-                'total_credits_issued': total_credits_issued,
-                'total_credits_balance': total_credits_balance,
-                'profile_completed_pct': profile_completed_pct
-            }
+            return self._fetch_system_statistics()
         except Exception as e:
             print(f"Error getting system statistics: {e}")
             return {
@@ -165,32 +175,145 @@ class AdminDatabaseManager:
                 'profile_completed_pct': 0
             }
 
-    def get_reservations_by_day_of_week(self) -> Dict:
-        """Get all reservations grouped by day of week"""
+    def _fetch_system_statistics(self) -> Dict:
+        """Consultar las estadísticas generales directamente en la base de datos"""
+        # Fechas
+        today = get_colombia_today()
+        today_str = today.strftime('%Y-%m-%d')
+
+        # Semana actual (Lunes a Domingo) y ventana de usuarios activos
+        days_since_monday = today.weekday()
+        week_start = today - timedelta(days=days_since_monday)
+        week_end = week_start + timedelta(days=6)
+        week_start_str = week_start.strftime('%Y-%m-%d')
+        week_end_str = week_end.strftime('%Y-%m-%d')
+        thirty_days_ago = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+
+        # Las consultas son independientes: lanzarlas en paralelo para pagar
+        # la latencia de red una sola vez en lugar de sumarla
+        # Solo se necesitan conteos: count='exact' con head=True devuelve el
+        # total en la cabecera Content-Range sin transferir filas
+        def count_rows(query):
+            return query.execute().count or 0
+
+        users_future = self._query_pool.submit(
+            count_rows, self.client.table('users').select('id', count='exact', head=True))
+        vip_users_future = self._query_pool.submit(
+            count_rows, self.client.table('users').select('id', count='exact', head=True).eq('is_vip', True))
+        completed_profiles_future = self._query_pool.submit(
+            count_rows, self.client.table('users').select('id', count='exact', head=True).eq('profile_completed', True))
+        reservations_today_future = self._query_pool.submit(
+            count_rows, self.client.table('reservations').select('id', count='exact', head=True).eq('date', today_str))
+        blocked_today_future = self._query_pool.submit(
+            count_rows, self.client.table('blocked_slots').select('id', count='exact', head=True).eq('date', today_str))
+        all_reservations_future = self._query_pool.submit(
+            count_rows, self.client.table('reservations').select('id', count='exact', head=True))
+        week_reservations_future = self._query_pool.submit(
+            count_rows, self.client.table('reservations').select('id', count='exact', head=True).gte(
+                'date', week_start_str
+            ).lte('date', week_end_str))
+        active_reservations_future = self._query_pool.submit(
+            lambda: self.client.table('reservations').select('user_id').gte(
+                'date', thirty_days_ago
+            ).execute())
+        credit_totals_future = self._query_pool.submit(
+            lambda: self.client.rpc('credit_statistics', {'p_since': today_str}).execute())
+
+        # Usuarios totales y VIP
+        total_users = users_future.result()
+        vip_users = vip_users_future.result()
+        completed_profiles = completed_profiles_future.result()
+        profile_completed_pct = round((completed_profiles / max(total_users, 1)) * 100, 1)
+
+        # Reservas de hoy
+        today_reservations_count = reservations_today_future.result()
+
+        # Tasa de ocupación hoy
+        # Slots disponibles = 15 horas (6-20) menos slots bloqueados
+        available_slots = 15 - blocked_today_future.result()
+        today_occupancy_rate = round((today_reservations_count / max(available_slots, 1)) * 100, 1)
+
+        # Total reservas (histórico)
+        total_reservations = all_reservations_future.result()
+
+        # Reservas esta semana
+        week_reservations_count = week_reservations_future.result()
+
+        # Usuarios activos (últimos 30 días)
+        active_users_30d = len({r['user_id'] for r in active_reservations_future.result().data})
+
+        # Créditos emitidos (histórico) y balance actual, sumados en Postgres
         try:
-            result = self.client.table('reservations').select('date').execute()
+            credit_totals = credit_totals_future.result().data[0]
+            total_credits_issued = credit_totals['credits_issued']
+            total_credits_balance = credit_totals['total_credits']
+        except Exception as e:
+            print(f"credit_statistics RPC unavailable, summing credits in Python: {e}")
 
-            # Count by day of week
-            day_counts = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}  # Mon-Sun
+            # Créditos totales emitidos (histórico)
+            try:
+                credits_issued_result = self.client.table('credit_transactions').select('amount').eq(
+                    'transaction_type', 'admin_grant'
+                ).execute()
+                total_credits_issued = sum(t['amount'] for t in credits_issued_result.data)
+            except Exception:
+                total_credits_issued = 0
 
-            for reservation in result.data:
-                date_obj = datetime.strptime(reservation['date'], '%Y-%m-%d').date()
-                day_of_week = date_obj.weekday()
-                day_counts[day_of_week] += 1
+            # Créditos en sistema (balance actual de usuarios)
+            users_result = self.client.table('users').select('credits').execute()
+            total_credits_balance = sum(u['credits'] or 0 for u in users_result.data)
+
+        return {
+            'total_users': total_users,
+            'vip_users': vip_users,
+            'active_users_30d': active_users_30d,
+            'total_reservations': total_reservations,
+            'week_reservations': week_reservations_count,
+            'today_reservations': today_reservations_count,
+            'today_occupancy_rate': today_occupancy_rate,
+            'total_credits_issued': total_credits_issued,
+            'total_credits_balance': total_credits_balance,
+            'profile_completed_pct': profile_completed_pct
+        }
+
+    def get_reservations_by_day_of_week(self) -> Dict:
+        """Get all reservations grouped by day of week - agrupado en Postgres vía RPC"""
+        try:
+            try:
+                result = self.client.rpc('weekday_reservation_stats', {}).execute()
+                # dow es ISO: 1 = lunes ... 7 = domingo
+                day_counts = [0] * 7  # Mon-Sun
+                for row in result.data:
+                    day_counts[row['dow'] - 1] = row['count']
+            except Exception as e:
+                print(f"weekday_reservation_stats RPC unavailable, using Python aggregation: {e}")
+                day_counts = self._get_reservations_by_day_of_week_fallback()
 
             # Convert to readable format
-            days_spanish = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-            total = sum(day_counts.values())
+            total = sum(day_counts)
 
             return {
-                'days': [days_spanish[i] for i in range(7)],
-                'counts': [day_counts[i] for i in range(7)],
-                'percentages': [round((day_counts[i] / total * 100), 1) if total > 0 else 0 for i in range(7)]
+                'days': list(SPANISH_DAYS_FULL),
+                'counts': day_counts,
+                'percentages': [round((count / total * 100), 1) if total > 0 else 0 for count in day_counts]
             }
         except Exception as e:
             print(f"Error getting day of week stats: {e}")
             return {'days': [], 'counts': [], 'percentages': []}
 
+    def _get_reservations_by_day_of_week_fallback(self) -> List[int]:
+        """Fallback: contar en Python a partir de todas las fechas de reserva"""
+        result = self.client.table('reservations').select('date').execute()
+
+        # Contar reservas por fecha; cada fecha distinta se parsea una sola vez
+        date_counts = Counter(reservation['date'] for reservation in result.data)
+
+        # Count by day of week
+        day_counts = [0] * 7  # Mon-Sun
+        for date_str, count in date_counts.items():
+            day_counts[datetime.fromisoformat(date_str).weekday()] += count
+        return day_counts
+
     def search_users_for_reservations(self, search_term: str) -> tuple[List[Dict], str]:
         """
         Buscar usuarios por nombre o email para gestión de reservas
@@ -203,8 +326,8 @@ class AdminDatabaseManager:
         try:
             # Buscar por email o nombre
             result = self.client.table('users').select('id, email, full_name').or_(
-                f'email.ilike.%{search_term}%,full_name.ilike.%{search_term}%'
-            ).execute()
+                _ilike_any_filter(('email', 'full_name'), search_term)
+            ).limit(20).execute()
 
             users = [{'id': u['id'], 'email': u['email'], 'name': u['full_name']} for u in result.data]
             return (users, None)
@@ -221,15 +344,9 @@ class AdminDatabaseManager:
             filter_type: 'all', 'upcoming', 'past', 'this_week', 'this_month'
         """
         try:
-            # Get user_id from email
-            user_result = self.client.table('users').select('id').eq('email', user_email).execute()
-            if not user_result.data:
-                return []
-
-            user_id = user_result.data[0]['id']
-
-            # Base query
-            query = self.client.table('reservations').select('*').eq('user_id', user_id)
+            # Base query: filtrar por email con un INNER JOIN embebido a users,
+            # sin una consulta previa para obtener el user_id
+            query = self.client.table('reservations').select('*, users!inner(email)').eq('users.email', user_email)
 
             # Apply date filters
             today = get_colombia_today()  # Returns datetime.date object
@@ -257,6 +374,8 @@ class AdminDatabaseManager:
 
             # Formatear fechas de creación
             for reservation in result.data:
+                # El embed solo sirve para filtrar; mantener la forma original de las filas
+                reservation.pop('users', None)
                 if 'created_at' in reservation:
                     reservation['created_at'] = self._format_colombia_datetime(reservation['created_at'])
 
@@ -275,9 +394,25 @@ class AdminDatabaseManager:
             return 0
 
     def get_users_detailed_statistics(self, limit: int = None, offset: int = 0) -> List[Dict]:
-        """Get detailed statistics for all users with optional pagination"""
-        # Use Python-based processing (RPC function not implemented in database)
-        return self._get_users_detailed_statistics_fallback(limit=limit, offset=offset)
+        """Get detailed statistics for all users with optional pagination - agregado en Postgres vía RPC"""
+        try:
+            result = self.client.rpc('users_detailed_statistics', {
+                'p_limit': limit,
+                'p_offset': offset
+            }).execute()
+            return [{
+                'email': row['email'],
+                'name': row['name'],
+                'registered_date': row['created_at'][:10] if row['created_at'] else 'N/A',
+                'total_credits_bought': row['total_credits_bought'],
+                'total_reservations': row['total_reservations'],
+                # favorite_dow es ISO: 1 = lunes ... 7 = domingo
+                'favorite_day': SPANISH_DAYS_FULL[row['favorite_dow'] - 1] if row['favorite_dow'] else 'N/A',
+                'favorite_time': f"{row['favorite_hour']:02d}:00" if row['favorite_hour'] is not None else 'N/A'
+            } for row in result.data]
+        except Exception as e:
+            print(f"users_detailed_statistics RPC unavailable, using Python aggregation: {e}")
+            return self._get_users_detailed_statistics_fallback(limit=limit, offset=offset)
 
     def _get_users_detailed_statistics_fallback(self, limit: int = None, offset: int = 0) -> List[Dict]:
         """Fallback method using Python processing (for backwards compatibility)"""
@@ -320,19 +455,20 @@ class AdminDatabaseManager:
             for res in reservations_result.data:
                 user_id = res['user_id']
                 if user_id not in user_reservations_by_id:
+                    # Conteos por índice: 7 días de la semana y 24 horas del día
                     user_reservations_by_id[user_id] = {
                         'total': 0,
-                        'days': [],
-                        'hours': []
+                        'days': [0] * 7,
+                        'hours': [0] * 24
                     }
                 user_reservations_by_id[user_id]['total'] += 1
 
                 # Add day of week
                 date_obj = datetime.strptime(res['date'], '%Y-%m-%d').date()
-                user_reservations_by_id[user_id]['days'].append(date_obj.weekday())
+                user_reservations_by_id[user_id]['days'][date_obj.weekday()] += 1
 
                 # Add hour
-                user_reservations_by_id[user_id]['hours'].append(res['hour'])
+                user_reservations_by_id[user_id]['hours'][res['hour']] += 1
 
             # Convert to email-based dict for backwards compatibility
             user_reservations = {}
@@ -342,27 +478,18 @@ class AdminDatabaseManager:
                     user_reservations[email] = res_data
 
             # Build final user stats
-            days_spanish = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-
             user_stats = []
             for user in users_result.data:
                 email = user['email']
-                res_data = user_reservations.get(email, {'total': 0, 'days': [], 'hours': []})
+                res_data = user_reservations.get(email)
 
-                # Calculate favorite day
-                if res_data['days']:
-                    from collections import Counter
-                    most_common_day = Counter(res_data['days']).most_common(1)[0][0]
-                    favorite_day = days_spanish[most_common_day]
+                # Calculate favorite day and time (índice con el mayor conteo)
+                if res_data:
+                    days, hours = res_data['days'], res_data['hours']
+                    favorite_day = SPANISH_DAYS_FULL[max(range(7), key=days.__getitem__)]
+                    favorite_time = f"{max(range(24), key=hours.__getitem__):02d}:00"
                 else:
                     favorite_day = 'N/A'
-
-                # Calculate favorite time
-                if res_data['hours']:
-                    from collections import Counter
-                    most_common_hour = Counter(res_data['hours']).most_common(1)[0][0]
-                    favorite_time = f"{most_common_hour:02d}:00"
-                else:
                     favorite_time = 'N/A'
 
                 user_stats.append({
@@ -370,7 +497,7 @@ class AdminDatabaseManager:
                     'name': user['full_name'],
                     'registered_date': user['created_at'][:10] if user['created_at'] else 'N/A',
                     'total_credits_bought': credits_dict.get(email, 0),
-                    'total_reservations': res_data['total'],
+                    'total_reservations': res_data['total'] if res_data else 0,
                     'favorite_day': favorite_day,
                     'favorite_time': favorite_time
                 })
@@ -387,7 +514,99 @@ class AdminDatabaseManager:
     def cancel_reservation_with_notification(self, reservation_id: int, user_email: str,
                                              cancellation_reason: str = "", admin_username: str = "admin") -> bool:
         """
-        Cancelar reserva con proceso atómico completo
+        Cancelar reserva en una sola transacción de Postgres y notificar al usuario
+
+        La función admin_cancel_reservation reembolsa el crédito, registra la transacción,
+        elimina la reserva y guarda el registro de cancelación de forma atómica.
+        El email se envía después; si falla, la cancelación se mantiene.
+        """
+        # Validar que email manager esté configurado antes de modificar datos
+        if not email_manager.is_configured():
+            print("[Cancellation] ERROR: Email manager not configured")
+            return False
+
+        reason = cancellation_reason or "Sin motivo especificado"
+
+        try:
+            print(f"[Cancellation] Cancelling reservation {reservation_id} via admin_cancel_reservation")
+            result = self._execute_with_retry(self.client.rpc('admin_cancel_reservation', {
+                'p_reservation_id': reservation_id,
+                'p_reason': reason,
+                'p_admin': admin_username
+            }), idempotent=False)
+        except Exception as e:
+            if is_missing_rpc_error(e):
+                print(f"[Cancellation] admin_cancel_reservation RPC unavailable, using step-by-step cancellation: {e}")
+                return self._cancel_reservation_with_notification_fallback(
+                    reservation_id, user_email, cancellation_reason, admin_username
+                )
+
+            # La función pudo haberse ejecutado (p. ej. timeout tras el commit): no repetir
+            # la cancelación paso a paso, sino comprobar si quedó registrada
+            print(f"[Cancellation] admin_cancel_reservation call failed ({e}), checking whether it was applied")
+            outcome = self._find_committed_cancellation(reservation_id)
+            if outcome is None:
+                print(f"[Cancellation] ERROR: Outcome unknown for reservation {reservation_id}; not retried")
+                return False
+            print(f"[Cancellation] Cancellation record found for reservation {reservation_id}")
+        else:
+            outcome = result.data
+            if not outcome or not outcome.get('success'):
+                error = outcome.get('error') if outcome else 'Sin respuesta'
+                print(f"[Cancellation] ERROR: {error}")
+                return False
+
+            print(f"[Cancellation] ✓ Reservation cancelled (new balance: {outcome['new_credits']})")
+
+        try:
+            email_manager.send_reservation_cancelled_notification(
+                user_email=user_email,
+                user_name=outcome['user_name'],
+                date=outcome['date'],
+                hour=outcome['hour'],
+                cancelled_by='admin',
+                reason=reason
+            )
+            print("[Cancellation] ✓ Email sent successfully")
+        except Exception as e:
+            # Email failure is non-critical - cancellation already committed
+            print(f"[Cancellation] WARNING: Email notification failed: {e}")
+
+        return True
+
+    def _find_committed_cancellation(self, reservation_id) -> Optional[Dict]:
+        """
+        Buscar el registro que admin_cancel_reservation guarda al confirmar la cancelación
+
+        Returns:
+            dict con user_name, date y hour (como la respuesta de la RPC) si la
+            cancelación quedó aplicada; None si no hay registro o no se pudo consultar
+        """
+        try:
+            result = self._execute_with_retry(
+                self.client.table('reservation_cancellations').select(
+                    'user_name, reservation_date, reservation_hour'
+                ).eq('original_reservation_id', reservation_id).limit(1)
+            )
+            if not result.data:
+                return None
+
+            record = result.data[0]
+            return {
+                'success': True,
+                'user_name': record['user_name'],
+                'date': record['reservation_date'],
+                'hour': record['reservation_hour']
+            }
+        except Exception as e:
+            print(f"[Cancellation] Error checking cancellation record: {e}")
+            return None
+
+    def _cancel_reservation_with_notification_fallback(self, reservation_id: int, user_email: str,
+                                                       cancellation_reason: str = "",
+                                                       admin_username: str = "admin") -> bool:
+        """
+        Fallback: cancelar reserva paso a paso desde Python (sin la función SQL)
 
         IMPORTANTE: Solo retorna True si TODAS las operaciones se completan exitosamente:
         1. Reembolso de crédito
@@ -406,24 +625,26 @@ class AdminDatabaseManager:
 
         try:
             # PASO 1: Obtener y validar todos los datos necesarios
-            print(f"[Cancellation] Step 1: Fetching reservation data for ID {reservation_id}")
-            reservation_result = self.client.table('reservations').select('*').eq('id', reservation_id).execute()
+            # La reserva y su usuario llegan en una sola consulta (JOIN embebido)
+            print(f"[Cancellation] Step 1: Fetching reservation and user data for ID {reservation_id}")
+            reservation_result = self._execute_with_retry(
+                self.client.table('reservations').select(
+                    '*, users(id, email, full_name, credits)'
+                ).eq('id', reservation_id)
+            )
             if not reservation_result.data:
                 print(f"[Cancellation] ERROR: Reservation {reservation_id} not found")
                 return False
 
             reservation = reservation_result.data[0]
+            user = reservation.pop('users')
             reservation_backup = reservation.copy()  # Backup for potential rollback
             user_id = reservation['user_id']
 
-            # Obtener datos del usuario
-            print(f"[Cancellation] Step 2: Fetching user data for user_id {user_id}")
-            user_result = self.client.table('users').select('id, email, full_name, credits').eq('id', user_id).execute()
-            if not user_result.data:
+            if not user:
                 print(f"[Cancellation] ERROR: User {user_id} not found")
                 return False
 
-            user = user_result.data[0]
             previous_credits = user['credits'] or 0
             user_name = user['full_name']
 
@@ -435,21 +656,21 @@ class AdminDatabaseManager:
             print("[Cancellation] All validations passed, proceeding with cancellation")
 
             # PASO 2: Reembolsar crédito (operación reversible)
-            print(f"[Cancellation] Step 3: Refunding credit to user (current: {previous_credits})")
+            print(f"[Cancellation] Step 2: Refunding credit to user (current: {previous_credits})")
             try:
                 new_credits = previous_credits + 1
-                self.client.table('users').update({
+                self._execute_with_retry(self.client.table('users').update({
                     'credits': new_credits
-                }).eq('id', user_id).execute()
+                }).eq('id', user_id))
 
                 # Registrar transacción de reembolso
-                self.client.table('credit_transactions').insert({
+                self._execute_with_retry(self.client.table('credit_transactions').insert({
                     'user_id': user_id,
                     'amount': 1,
                     'transaction_type': 'reservation_refund',
                     'description': f'Reembolso por cancelación admin - {reservation["date"]} {reservation["hour"]}:00',
                     'admin_user': admin_username
-                }).execute()
+                }), idempotent=False)
 
                 credit_refunded = True
                 print(f"[Cancellation] ✓ Credit refunded successfully (new balance: {new_credits})")
@@ -458,9 +679,12 @@ class AdminDatabaseManager:
                 return False
 
             # PASO 3: Eliminar reserva (reversible mediante reinserción)
-            print(f"[Cancellation] Step 4: Deleting reservation {reservation_id}")
+            print(f"[Cancellation] Step 3: Deleting reservation {reservation_id}")
             try:
-                delete_result = self.client.table('reservations').delete().eq('id', reservation_id).execute()
+                # No idempotente: un reintento tras un borrado exitoso devolvería datos vacíos
+                delete_result = self._execute_with_retry(
+                    self.client.table('reservations').delete().eq('id', reservation_id), idempotent=False
+                )
                 if not delete_result.data:
                     raise Exception("Delete operation returned no data")
 
@@ -471,13 +695,13 @@ class AdminDatabaseManager:
                 # ROLLBACK: Restar el crédito que agregamos
                 if credit_refunded:
                     print("[Cancellation] ROLLBACK: Removing refunded credit")
-                    self.client.table('users').update({
+                    self._execute_with_retry(self.client.table('users').update({
                         'credits': previous_credits
-                    }).eq('id', user_id).execute()
+                    }).eq('id', user_id))
                 return False
 
             # PASO 4: Enviar email de notificación
-            print(f"[Cancellation] Step 5: Sending email notification to {user_email}")
+            print(f"[Cancellation] Step 4: Sending email notification to {user_email}")
             try:
                 email_manager.send_reservation_cancelled_notification(
                     user_email=user_email,
@@ -495,7 +719,7 @@ class AdminDatabaseManager:
                 print("[Cancellation] Cancellation completed successfully despite email failure")
 
             # PASO 5: Guardar registro de cancelación (no crítico, pero se intenta)
-            print("[Cancellation] Step 6: Saving cancellation record")
+            print("[Cancellation] Step 5: Saving cancellation record")
             try:
                 cancellation_saved = self.save_cancellation_record(
                     reservation_id,
@@ -526,9 +750,9 @@ class AdminDatabaseManager:
             if credit_refunded and user_id and previous_credits is not None:
                 try:
                     print("[Cancellation] ROLLBACK: Removing refunded credit")
-                    self.client.table('users').update({
+                    self._execute_with_retry(self.client.table('users').update({
                         'credits': previous_credits
-                    }).eq('id', user_id).execute()
+                    }).eq('id', user_id))
                 except Exception as rollback_error:
                     print(f"[Cancellation] ERROR during rollback: {rollback_error}")
 
@@ -544,9 +768,12 @@ class AdminDatabaseManager:
                    - Si falla: ([], "error message")
         """
         try:
-            result = self.client.table('users').select('*').or_(
-                f'email.ilike.%{search_term}%,full_name.ilike.%{search_term}%'
-            ).limit(20).execute()
+            # Solo las columnas que muestra la UI, los 20 usuarios más recientes
+            result = self.client.table('users').select(
+                'id, email, full_name, credits, is_active, is_vip, first_login_completed, created_at'
+            ).or_(
+                _ilike_any_filter(('email', 'full_name'), search_term)
+            ).order('created_at', desc=True).limit(20).execute()
 
             # Formatear fechas para cada usuario
             for user in result.data:
@@ -581,14 +808,33 @@ class AdminDatabaseManager:
             return (False, error_msg)
 
     def get_user_stats(self, user_id: int) -> Dict:
-        """Obtener estadísticas de un usuario específico - Now uses user_id"""
+        """Obtener estadísticas de un usuario específico - una sola consulta vía RPC"""
+        today = get_colombia_today_str()
+        try:
+            result = self.client.rpc('user_reservation_summary', {
+                'p_user_id': user_id,
+                'p_today': today
+            }).execute()
+            summary = result.data[0]
+
+            return {
+                'total_reservations': summary['total_reservations'],
+                'active_reservations': summary['active_reservations'],
+                'last_reservation': summary['last_reservation']
+            }
+        except Exception as e:
+            print(f"user_reservation_summary RPC unavailable, using separate queries: {e}")
+            return self._get_user_stats_fallback(user_id)
+
+    def _get_user_stats_fallback(self, user_id: int) -> Dict:
+        """Fallback: estadísticas del usuario con una consulta por métrica"""
         try:
             # Total de reservas (now uses user_id)
             total_result = self.client.table('reservations').select('id').eq('user_id', user_id).execute()
             total_reservations = len(total_result.data)
 
             # Reservas futuras
-            today = get_colombia_today().strftime('%Y-%m-%d')
+            today = get_colombia_today_str()
             future_result = self.client.table('reservations').select('id').eq('user_id', user_id).gte('date',
                                                                                                   today).execute()
             active_reservations = len(future_result.data)
@@ -608,90 +854,91 @@ class AdminDatabaseManager:
             return {'total_reservations': 0, 'active_reservations': 0, 'last_reservation': None}
 
     def get_user_reservation_statistics(self) -> List[Dict]:
-        """Obtener estadísticas de reservas por usuario - Now uses JOIN"""
+        """Obtener top 10 de usuarios por reservas - agregado en Postgres vía RPC"""
+        try:
+            result = self.client.rpc('top_users_by_reservations', {'p_limit': 10}).execute()
+            return [{
+                'email': row['email'],
+                'name': row['name'],
+                'reservations': row['reservations'],
+                # favorite_dow es ISO: 1 = lunes ... 7 = domingo
+                'favorite_day': SPANISH_DAYS_FULL[row['favorite_dow'] - 1] if row['favorite_dow'] else 'N/A',
+                'favorite_hour': f"{row['favorite_hour']}:00" if row['favorite_hour'] is not None else 'N/A'
+            } for row in result.data]
+        except Exception as e:
+            print(f"top_users_by_reservations RPC unavailable, using Python aggregation: {e}")
+            return self._get_user_reservation_statistics_fallback()
+
+    def _get_user_reservation_statistics_fallback(self) -> List[Dict]:
+        """Fallback: agregar en Python a partir de todas las reservas"""
         try:
             result = self.client.table('reservations').select('user_id, date, hour, users(email, full_name)').execute()
 
             # Contar reservas por usuario y tracking de días/horas
-            user_counts = {}
-            days_spanish = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-
-            for reservation in result.data:
-                if not reservation.get('users'):
-                    continue
-
+            rows = [reservation for reservation in result.data if reservation.get('users')]
+            user_counts = Counter(reservation['user_id'] for reservation in rows)
+            users = {reservation['user_id']: reservation['users'] for reservation in rows}
+            user_hours = {}
+            user_dates = {}
+            for reservation in rows:
                 user_id = reservation['user_id']
-                email = reservation['users']['email']
-                name = reservation['users']['full_name']
-                hour = reservation.get('hour')
-                date_str = reservation.get('date')
-
-                if user_id in user_counts:
-                    user_counts[user_id]['count'] += 1
-                    if hour:
-                        user_counts[user_id]['hours'].append(hour)
-                    if date_str:
-                        user_counts[user_id]['dates'].append(date_str)
-                else:
-                    user_counts[user_id] = {
-                        'email': email,
-                        'name': name,
-                        'count': 1,
-                        'hours': [hour] if hour else [],
-                        'dates': [date_str] if date_str else []
-                    }
+                if reservation.get('hour'):
+                    user_hours.setdefault(user_id, Counter())[reservation['hour']] += 1
+                if reservation.get('date'):
+                    user_dates.setdefault(user_id, Counter())[reservation['date']] += 1
 
-            # Convertir a lista con día/hora favoritos
+            # most_common(10) usa un heap: solo se ordenan los 10 primeros
             user_stats = []
-            for user_id, data in user_counts.items():
+            for user_id, count in user_counts.most_common(10):
                 # Calculate favorite hour
                 favorite_hour = 'N/A'
-                if data['hours']:
-                    hour_counts = {}
-                    for h in data['hours']:
-                        hour_counts[h] = hour_counts.get(h, 0) + 1
-                    most_common_hour = max(hour_counts, key=hour_counts.get)
-                    favorite_hour = f"{most_common_hour}:00"
-
-                # Calculate favorite day
+                if user_id in user_hours:
+                    favorite_hour = f"{user_hours[user_id].most_common(1)[0][0]}:00"
+
+                # Calculate favorite day (cada fecha distinta se parsea una sola vez)
                 favorite_day = 'N/A'
-                if data['dates']:
-                    day_counts = {}
-                    for d in data['dates']:
-                        try:
-                            weekday = datetime.strptime(d, '%Y-%m-%d').weekday()
-                            day_counts[weekday] = day_counts.get(weekday, 0) + 1
-                        except:
-                            pass
-                    if day_counts:
-                        most_common_day = max(day_counts, key=day_counts.get)
-                        favorite_day = days_spanish[most_common_day]
+                day_counts = Counter()
+                for d, date_count in user_dates.get(user_id, {}).items():
+                    try:
+                        day_counts[datetime.strptime(d, '%Y-%m-%d').weekday()] += date_count
+                    except ValueError:
+                        pass
+                if day_counts:
+                    favorite_day = SPANISH_DAYS_FULL[day_counts.most_common(1)[0][0]]
 
                 user_stats.append({
-                    'email': data['email'],
-                    'name': data['name'],
-                    'reservations': data['count'],
+                    'email': users[user_id]['email'],
+                    'name': users[user_id]['full_name'],
+                    'reservations': count,
                     'favorite_day': favorite_day,
                     'favorite_hour': favorite_hour
                 })
 
-            return sorted(user_stats, key=lambda x: x['reservations'], reverse=True)[:10]
+            return user_stats
         except Exception as e:
             print(f"Error getting user reservation statistics: {e}")
             return []
 
     def get_hourly_reservation_stats(self) -> List[Dict]:
-        """Obtener estadísticas de reservas por hora"""
+        """Obtener estadísticas de reservas por hora - agrupado en Postgres vía RPC"""
+        try:
+            result = self.client.rpc('hourly_reservation_stats', {}).execute()
+            return [{'hour': row['hour'], 'count': row['count']} for row in result.data]
+        except Exception as e:
+            print(f"hourly_reservation_stats RPC unavailable, using Python aggregation: {e}")
+            return self._get_hourly_reservation_stats_fallback()
+
+    def _get_hourly_reservation_stats_fallback(self) -> List[Dict]:
+        """Fallback: contar en Python a partir de todas las reservas"""
         try:
             result = self.client.table('reservations').select('hour').execute()
 
-            # Agrupar por hora
-            hour_counts = {}
+            # Una posición por hora del día: sin hashing ni ordenamiento posterior
+            hour_counts = [0] * 24
             for reservation in result.data:
-                hour = reservation['hour']
-                hour_counts[hour] = hour_counts.get(hour, 0) + 1
+                hour_counts[reservation['hour']] += 1
 
-            return [{'hour': hour, 'count': count} for hour, count in sorted(hour_counts.items())]
+            return [{'hour': hour, 'count': count} for hour, count in enumerate(hour_counts) if count]
         except Exception:
             return []
 
@@ -721,15 +968,19 @@ class AdminDatabaseManager:
             # Initialize 7x15 matrix (7 days, 15 hours from 6-20)
             heatmap = [[0 for _ in range(15)] for _ in range(7)]
 
+            # Día de la semana por fecha: cada fecha distinta se parsea una sola vez
+            weekdays = {}
+
             for reservation in result.data:
-                date_obj = datetime.strptime(reservation['date'], '%Y-%m-%d').date()
-                day_of_week = date_obj.weekday()  # 0=Monday, 6=Sunday
+                date_str = reservation['date']
                 hour = reservation['hour']
 
                 # Map hour 6-20 to index 0-14
                 if 6 <= hour <= 20:
-                    hour_index = hour - 6
-                    heatmap[day_of_week][hour_index] += 1
+                    day_of_week = weekdays.get(date_str)
+                    if day_of_week is None:
+                        day_of_week = weekdays[date_str] = datetime.fromisoformat(date_str).weekday()  # 0=Monday, 6=Sunday
+                    heatmap[day_of_week][hour - 6] += 1
 
             return heatmap
         except Exception as e:
@@ -749,10 +1000,6 @@ class AdminDatabaseManager:
         """
         try:
             today = get_colombia_today()
-            days_spanish = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
-            months_spanish = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun',
-                            'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
-
             dates = []
             occupancy_rates = []
             reservations_count = []
@@ -783,7 +1030,7 @@ class AdminDatabaseManager:
                     available_slots = max(15 - num_blocked, 1)
                     occupancy = round((num_reservations / available_slots) * 100, 1)
 
-                    dates.append(f"{days_spanish[i]} {current_date.strftime('%d/%m')}")
+                    dates.append(f"{SPANISH_DAYS[i]} {current_date.strftime('%d/%m')}")
                     occupancy_rates.append(occupancy)
                     reservations_count.append(num_reservations)
                     available_slots_list.append(available_slots)
@@ -799,7 +1046,7 @@ class AdminDatabaseManager:
                     target_month += 12
                     target_year -= 1
 
-                period_label = f"{months_spanish[target_month - 1]} {target_year}"
+                period_label = f"{SPANISH_MONTHS[target_month - 1]} {target_year}"
 
                 # Get days in month
                 if target_month == 12:
@@ -875,7 +1122,7 @@ class AdminDatabaseManager:
                     available_slots = max((15 * days_in_month) - month_blocked, 1)
                     occupancy = round((month_reservations / available_slots) * 100, 1)
 
-                    dates.append(months_spanish[month - 1])
+                    dates.append(SPANISH_MONTHS[month - 1])
                     occupancy_rates.append(occupancy)
                     reservations_count.append(month_reservations)
                     available_slots_list.append(available_slots)
@@ -920,14 +1167,11 @@ class AdminDatabaseManager:
             if not all_reservations.data:
                 return 0.0
 
-            # Get unique dates with reservations
-            dates_with_data = set()
-            reservations_by_date = {}
-
+            # Get unique dates with reservations (las claves del contador)
+            reservations_by_date = defaultdict(int)
             for res in all_reservations.data:
-                date = res['date']
-                dates_with_data.add(date)
-                reservations_by_date[date] = reservations_by_date.get(date, 0) + 1
+                reservations_by_date[res['date']] += 1
+            dates_with_data = reservations_by_date.keys()
 
             # Get blocked slots for those dates
             total_occupancy = 0
@@ -943,10 +1187,50 @@ class AdminDatabaseManager:
             return 0.0
 
     def add_credits_to_user(self, email: str, credits_amount: int, reason: str, admin_username: str) -> bool:
-        """Agregar créditos a un usuario"""
+        """Agregar créditos a un usuario - suma y registro atómicos vía RPC"""
+        try:
+            return self._adjust_user_credits(email, credits_amount, 'admin_grant', reason, admin_username)
+        except Exception as e:
+            if is_missing_rpc_error(e):
+                print(f"admin_adjust_credits RPC unavailable, falling back to step-by-step update: {e}")
+                return self._add_credits_to_user_fallback(email, credits_amount, reason, admin_username)
+            # El ajuste pudo haberse aplicado: no repetirlo por el camino no atómico
+            print(f"Error adjusting credits (outcome unknown, not retried): {e}")
+            return False
+
+    def remove_credits_from_user(self, email: str, credits_amount: int, reason: str, admin_username: str) -> bool:
+        """Quitar créditos a un usuario - resta y registro atómicos vía RPC (nunca deja saldo negativo)"""
+        try:
+            return self._adjust_user_credits(email, -credits_amount, 'admin_deduct', reason, admin_username)
+        except Exception as e:
+            if is_missing_rpc_error(e):
+                print(f"admin_adjust_credits RPC unavailable, falling back to step-by-step update: {e}")
+                return self._remove_credits_from_user_fallback(email, credits_amount, reason, admin_username)
+            # El ajuste pudo haberse aplicado: no repetirlo por el camino no atómico
+            print(f"Error adjusting credits (outcome unknown, not retried): {e}")
+            return False
+
+    def _adjust_user_credits(self, email: str, amount: int, transaction_type: str,
+                             reason: str, admin_username: str) -> bool:
+        """Aplicar un ajuste de créditos y registrar la transacción en una sola llamada"""
+        # No idempotente: solo se reintenta si la conexión no llegó a establecerse
+        result = self._execute_with_retry(self.client.rpc('admin_adjust_credits', {
+            'p_email': email,
+            'p_amount': amount,
+            'p_transaction_type': transaction_type,
+            'p_description': reason,
+            'p_admin_user': admin_username
+        }), idempotent=False)
+
+        return bool(result.data)
+
+    def _add_credits_to_user_fallback(self, email: str, credits_amount: int, reason: str, admin_username: str) -> bool:
+        """Fallback: leer, sumar y registrar en tres llamadas (no atómico)"""
         try:
             # Buscar usuario por email
-            user_result = self.client.table('users').select('id, credits').eq('email', email.strip().lower()).execute()
+            user_result = self._execute_with_retry(
+                self.client.table('users').select('id, credits').eq('email', email.strip().lower())
+            )
 
             if not user_result.data:
                 return False
@@ -957,19 +1241,19 @@ class AdminDatabaseManager:
             new_credits = current_credits + credits_amount
 
             # Actualizar créditos del usuario
-            update_result = self.client.table('users').update({
+            update_result = self._execute_with_retry(self.client.table('users').update({
                 'credits': new_credits
-            }).eq('id', user_id).execute()
+            }).eq('id', user_id))
 
             if update_result.data:
                 # Registrar transacción
-                self.client.table('credit_transactions').insert({
+                self._execute_with_retry(self.client.table('credit_transactions').insert({
                     'user_id': user_id,
                     'amount': credits_amount,
                     'transaction_type': 'admin_grant',
                     'description': reason,
                     'admin_user': admin_username
-                }).execute()
+                }), idempotent=False)
 
                 return True
             return False
@@ -977,11 +1261,13 @@ class AdminDatabaseManager:
             print(f"Error adding credits: {e}")
             return False
 
-    def remove_credits_from_user(self, email: str, credits_amount: int, reason: str, admin_username: str) -> bool:
-        """Quitar créditos a un usuario"""
+    def _remove_credits_from_user_fallback(self, email: str, credits_amount: int, reason: str, admin_username: str) -> bool:
+        """Fallback: leer, restar y registrar en tres llamadas (no atómico)"""
         try:
             # Buscar usuario por email
-            user_result = self.client.table('users').select('id, credits').eq('email', email.strip().lower()).execute()
+            user_result = self._execute_with_retry(
+                self.client.table('users').select('id, credits').eq('email', email.strip().lower())
+            )
 
             if not user_result.data:
                 return False
@@ -997,19 +1283,19 @@ class AdminDatabaseManager:
             new_credits = current_credits - credits_amount
 
             # Actualizar créditos del usuario
-            update_result = self.client.table('users').update({
+            update_result = self._execute_with_retry(self.client.table('users').update({
                 'credits': new_credits
-            }).eq('id', user_id).execute()
+            }).eq('id', user_id))
 
             if update_result.data:
                 # Registrar transacción
-                self.client.table('credit_transactions').insert({
+                self._execute_with_retry(self.client.table('credit_transactions').insert({
                     'user_id': user_id,
                     'amount': -credits_amount,
                     'transaction_type': 'admin_deduct',
                     'description': reason,
                     'admin_user': admin_username
-                }).execute()
+                }), idempotent=False)
 
                 return True
             return False
@@ -1018,22 +1304,45 @@ class AdminDatabaseManager:
             return False
 
     def get_credit_statistics(self) -> Dict:
-        """Obtener estadísticas de créditos"""
+        """Obtener estadísticas de créditos - agregadas en Postgres vía RPC"""
+        today = get_colombia_today_str()
         try:
-            # Créditos totales en el sistema
-            users_result = self.client.table('users').select('credits').execute()
-            total_credits = sum([u['credits'] or 0 for u in users_result.data])
+            totals = self.client.rpc('credit_statistics', {'p_since': today}).execute().data[0]
 
-            # Usuarios con créditos
-            users_with_credits = len([u for u in users_result.data if (u['credits'] or 0) > 0])
+            return {
+                'total_credits': totals['total_credits'],
+                'users_with_credits': totals['users_with_credits'],
+                'credits_used_today': totals['credits_used_since']
+            }
+        except Exception as e:
+            print(f"credit_statistics RPC unavailable, using Python aggregation: {e}")
+            return self._get_credit_statistics_fallback()
 
-            # Créditos usados hoy
-            today = get_colombia_today().strftime('%Y-%m-%d')
-            used_today_result = self.client.table('credit_transactions').select('amount').eq(
-                'transaction_type', 'reservation_use'
-            ).gte('created_at', today).execute()
+    def _get_credit_statistics_fallback(self) -> Dict:
+        """Fallback: sumar créditos en Python"""
+        try:
+            # Las dos consultas son independientes: lanzarlas en paralelo
+            today = get_colombia_today_str()
+            users_future = self._query_pool.submit(
+                lambda: self.client.table('users').select('credits').execute())
+            used_today_future = self._query_pool.submit(
+                lambda: self.client.table('credit_transactions').select('amount').eq(
+                    'transaction_type', 'reservation_use'
+                ).gte('created_at', today).execute())
+
+            # Créditos totales en el sistema
+            # y usuarios con créditos, en una sola pasada sobre las filas
+            users_result = users_future.result()
+            total_credits = 0
+            users_with_credits = 0
+            for u in users_result.data:
+                credits = u['credits'] or 0
+                total_credits += credits
+                users_with_credits += credits > 0
 
-            credits_used_today = abs(sum([t['amount'] for t in used_today_result.data])) if used_today_result.data else 0
+            # Créditos usados hoy
+            used_today_result = used_today_future.result()
+            credits_used_today = abs(sum(t['amount'] for t in used_today_result.data))
 
             return {
                 'total_credits': total_credits,
@@ -1185,13 +1494,9 @@ class AdminDatabaseManager:
                 }
 
             # Group reservations by user
-            user_reservations = {}
+            user_reservations = defaultdict(list)
             for r in all_reservations.data:
-                user_id = r['user_id']
-                date = datetime.strptime(r['date'], '%Y-%m-%d').date()
-                if user_id not in user_reservations:
-                    user_reservations[user_id] = []
-                user_reservations[user_id].append(date)
+                user_reservations[r['user_id']].append(datetime.strptime(r['date'], '%Y-%m-%d').date())
 
             # Calculate metrics
             users_current_month = set()
@@ -1348,12 +1653,11 @@ class AdminDatabaseManager:
                         'date', check_date.strftime('%Y-%m-%d')
                     ).execute()
                     if not day_reservations.data or len(day_reservations.data) == 0:
-                        days_spanish = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
                         alerts.append({
                             'type': 'warning',
                             'icon': '📅',
                             'title': 'Día sin Reservas',
-                            'message': f'{days_spanish[check_date.weekday()]} {check_date.strftime("%d/%m")} no tuvo reservas'
+                            'message': f'{SPANISH_DAYS_FULL[check_date.weekday()]} {check_date.strftime("%d/%m")} no tuvo reservas'
                         })
                         break  # Only report the most recent one
 
@@ -1383,7 +1687,7 @@ class AdminDatabaseManager:
             user_ids = None
             if user_name_filter and user_name_filter.strip():
                 users_result = self.client.table('users').select('id').ilike(
-                    'full_name', f'%{user_name_filter.strip()}%'
+                    'full_name', f'%{_escape_like(user_name_filter.strip())}%'
                 ).execute()
                 user_ids = [u['id'] for u in users_result.data] if users_result.data else []
                 if not user_ids:
@@ -1424,7 +1728,7 @@ class AdminDatabaseManager:
             user_ids = None
             if user_name_filter and user_name_filter.strip():
                 users_result = self.client.table('users').select('id').ilike(
-                    'full_name', f'%{user_name_filter.strip()}%'
+                    'full_name', f'%{_escape_like(user_name_filter.strip())}%'
                 ).execute()
                 user_ids = [u['id'] for u in users_result.data] if users_result.data else []
                 if not user_ids:
@@ -1442,68 +1746,111 @@ class AdminDatabaseManager:
             print(f"Error getting credit transactions count: {e}")
             return 0
 
-    def get_all_users_for_export(self) -> List[Dict]:
-        """Obtener todos los usuarios para exportación"""
-        try:
-            result = self.client.table('users').select(
-                'id, email, full_name, credits, is_vip, first_login_completed, created_at'
-            ).order('created_at', desc=True).execute()
+    def _iter_pages(self, build_query, page_size: int = EXPORT_PAGE_SIZE):
+        """
+        Recorrer una consulta completa por páginas con range()
 
-            # Formatear datos para Excel
-            formatted_users = []
-            for user in result.data:
-                formatted_users.append({
-                    'ID': user['id'],
-                    'Nombre Completo': user['full_name'],
-                    'Email': user['email'],
-                    'Créditos': user['credits'] or 0,
-                    'Pertenece al Comité': 'Sí' if user.get('is_vip', False) else 'No',
-                    'Primer Login Completado': 'Sí' if user.get('first_login_completed', False) else 'No',
-                    'Fecha Registro': self._format_colombia_datetime(user['created_at'])
-                })
+        Args:
+            build_query: Función que devuelve un query builder nuevo (ya ordenado
+                         de forma estable); se llama una vez por página
+            page_size: Filas por página
 
-            return formatted_users
-        except Exception as e:
-            print(f"Error getting users for export: {e}")
-            return []
+        Yields:
+            list: Las filas de cada página
+        """
+        offset = 0
+        while True:
+            result = build_query().range(offset, offset + page_size - 1).execute()
+            if not result.data:
+                return
+            yield result.data
+            # Avanzar por lo recibido: el servidor puede limitar filas por respuesta
+            offset += len(result.data)
+
+    def _iter_pages_or_fallback(self, build_query, fallback, source: str):
+        """
+        Recorrer build_query por páginas; si la primera página falla (por ejemplo
+        porque la vista aún no existe en la base de datos) recorrer fallback()
 
-    def get_all_reservations_for_export(self) -> List[Dict]:
-        """Obtener todas las reservas para exportación - Uses JOIN to users table"""
+        Args:
+            build_query: Igual que en _iter_pages
+            fallback: Función que devuelve un iterable de páginas con la misma forma
+            source: Nombre de la fuente para el log
+        """
+        pages = self._iter_pages(build_query)
         try:
-            result = self.client.table('reservations').select(
-                'id, date, hour, user_id, created_at, users(full_name, email)'
-            ).order('date', desc=True).order('hour').execute()
-
-            # Formatear datos para Excel
-            formatted_reservations = []
-            for reservation in result.data:
-                # Formatear fecha más legible
-                from timezone_utils import format_date_display
-                fecha_display = format_date_display(reservation['date'])
-
-                # Get user data from JOIN
-                user_name = reservation['users']['full_name'] if reservation.get('users') else 'Usuario Eliminado'
-                user_email = reservation['users']['email'] if reservation.get('users') else 'N/A'
-
-                formatted_reservations.append({
-                    'ID Reserva': reservation['id'],
-                    'Fecha': fecha_display,
-                    'Hora': f"{reservation['hour']}:00 - {reservation['hour'] + 1}:00",
-                    'Nombre Usuario': user_name,
-                    'Email Usuario': user_email,
-                    'Fecha Creación': self._format_colombia_datetime(reservation['created_at'])
-                })
-
-            return formatted_reservations
+            first_page = next(pages, None)
         except Exception as e:
-            print(f"Error getting reservations for export: {e}")
-            return []
+            print(f"{source} unavailable, formatting in Python: {e}")
+            yield from fallback()
+            return
+
+        if first_page is not None:
+            yield first_page
+            yield from pages
+
+    def iter_all_users_for_export(self):
+        """Recorrer todos los usuarios para exportación, una página a la vez - formateados en la vista users_export_v"""
+        pages = self._iter_pages_or_fallback(
+            lambda: self.client.table('users_export_v').select(
+                'id, full_name, email, credits, is_vip_label, first_login_label, created_at_display'
+            ).order('created_at', desc=True).order('id'),
+            self._iter_users_export_pages_fallback,
+            'users_export_v view'
+        )
+
+        for page in pages:
+            # Formatear datos para Excel
+            yield from ({
+                'ID': user['id'],
+                'Nombre Completo': user['full_name'],
+                'Email': user['email'],
+                'Créditos': user['credits'],
+                'Pertenece al Comité': user['is_vip_label'],
+                'Primer Login Completado': user['first_login_label'],
+                'Fecha Registro': user['created_at_display']
+            } for user in page)
+
+    def _iter_users_export_pages_fallback(self):
+        """Fallback: leer la tabla users y calcular en Python las columnas de users_export_v"""
+        pages = self._iter_pages(lambda: self.client.table('users').select(
+            'id, email, full_name, credits, is_vip, first_login_completed, created_at'
+        ).order('created_at', desc=True).order('id'))
+
+        for page in pages:
+            yield [{
+                'id': user['id'],
+                'full_name': user['full_name'],
+                'email': user['email'],
+                'credits': user['credits'] or 0,
+                'is_vip_label': 'Sí' if user.get('is_vip', False) else 'No',
+                'first_login_label': 'Sí' if user.get('first_login_completed', False) else 'No',
+                'created_at_display': self._format_colombia_datetime(user['created_at'])
+            } for user in page]
+
+    def iter_all_reservations_for_export(self):
+        """Recorrer todas las reservas para exportación, una página a la vez - Uses JOIN to users table"""
+        pages = self._iter_pages(lambda: self.client.table('reservations').select(
+            'id, date, hour, user_id, created_at, users(full_name, email)'
+        ).order('date', desc=True).order('hour').order('id'))
+
+        for page in pages:
+            # Formatear datos para Excel (user data from JOIN)
+            # format_date_display está memoizada: cada día distinto se formatea una sola vez
+            yield from ({
+                'ID Reserva': reservation['id'],
+                'Fecha': format_date_display(reservation['date']),
+                'Hora': f"{reservation['hour']}:00 - {reservation['hour'] + 1}:00",
+                'Nombre Usuario': reservation['users']['full_name'] if reservation.get('users') else 'Usuario Eliminado',
+                'Email Usuario': reservation['users']['email'] if reservation.get('users') else 'N/A',
+                'Fecha Creación': self._format_colombia_datetime(reservation['created_at'])
+            } for reservation in page)
 
     def search_users_for_credits(self, search_term: str) -> List[Dict]:
         """Buscar usuarios por nombre o email para gestión de créditos"""
         try:
             result = self.client.table('users').select('id, email, full_name, credits').or_(
-                f'email.ilike.%{search_term}%,full_name.ilike.%{search_term}%'
+                _ilike_any_filter(('email', 'full_name'), search_term)
             ).order('full_name').execute()
 
             return [{
@@ -1516,41 +1863,46 @@ class AdminDatabaseManager:
             print(f"Error searching users for credits: {e}")
             return []
 
-    def get_credit_transactions_for_export(self) -> List[Dict]:
-        """Obtener transacciones de créditos para exportación"""
-        try:
-            result = self.client.table('credit_transactions').select(
-                'users(full_name, email), amount, transaction_type, description, admin_user, created_at'
-            ).order('created_at', desc=True).execute()
-
+    def iter_credit_transactions_for_export(self):
+        """Recorrer las transacciones de créditos para exportación, una página a la vez - formateadas en la vista credit_transactions_export_v"""
+        pages = self._iter_pages_or_fallback(
+            lambda: self.client.table('credit_transactions_export_v').select(
+                'user_name, user_email, amount, transaction_type_label, description, admin_user_display, created_at_display'
+            ).order('created_at', desc=True).order('id'),
+            self._iter_credit_transactions_export_pages_fallback,
+            'credit_transactions_export_v view'
+        )
+
+        for page in pages:
             # Formatear datos para Excel
-            formatted_transactions = []
-            for transaction in result.data:
-                user_name = transaction['users']['full_name'] if transaction['users'] else 'Usuario eliminado'
-                user_email = transaction['users']['email'] if transaction['users'] else 'N/A'
-
-                # Traducir tipos de transacción
-                transaction_types = {
-                    'admin_grant': 'Otorgado por Admin',
-                    'admin_deduct': 'Deducido por Admin',
-                    'reservation_use': 'Usado en Reserva',
-                    'reservation_refund': 'Reembolso de Reserva'
-                }
-
-                formatted_transactions.append({
-                    'Usuario': user_name,
-                    'Email': user_email,
-                    'Cantidad': transaction['amount'],
-                    'Tipo': transaction_types.get(transaction['transaction_type'], transaction['transaction_type']),
-                    'Descripción': transaction['description'],
-                    'Administrador': transaction['admin_user'] or 'Sistema',
-                    'Fecha y Hora': self._format_colombia_datetime(transaction['created_at'])  # FORMATEADO A COLOMBIA
-                })
-
-            return formatted_transactions
-        except Exception as e:
-            print(f"Error getting credit transactions for export: {e}")
-            return []
+            yield from ({
+                'Usuario': transaction['user_name'],
+                'Email': transaction['user_email'],
+                'Cantidad': transaction['amount'],
+                'Tipo': transaction['transaction_type_label'],
+                'Descripción': transaction['description'],
+                'Administrador': transaction['admin_user_display'],
+                'Fecha y Hora': transaction['created_at_display']  # FORMATEADO A COLOMBIA
+            } for transaction in page)
+
+    def _iter_credit_transactions_export_pages_fallback(self):
+        """Fallback: leer credit_transactions y calcular en Python las columnas de credit_transactions_export_v"""
+        pages = self._iter_pages(lambda: self.client.table('credit_transactions').select(
+            'users(full_name, email), amount, transaction_type, description, admin_user, created_at'
+        ).order('created_at', desc=True).order('id'))
+
+        for page in pages:
+            yield [{
+                'user_name': transaction['users']['full_name'] if transaction['users'] else 'Usuario eliminado',
+                'user_email': transaction['users']['email'] if transaction['users'] else 'N/A',
+                'amount': transaction['amount'],
+                'transaction_type_label': TRANSACTION_TYPE_LABELS.get(
+                    transaction['transaction_type'], transaction['transaction_type']
+                ),
+                'description': transaction['description'],
+                'admin_user_display': transaction['admin_user'] or 'Sistema',
+                'created_at_display': self._format_colombia_datetime(transaction['created_at'])
+            } for transaction in page]
 
     def get_current_lock_code(self) -> Optional[str]:
         """Obtener la contraseña actual del candado"""
@@ -1564,7 +1916,7 @@ class AdminDatabaseManager:
     def get_users_with_active_reservations(self) -> List[Dict]:
         """Obtener lista de usuarios con reservas activas (que no han pasado) - Uses JOIN"""
         try:
-            today = get_colombia_today().strftime('%Y-%m-%d')
+            today = get_colombia_today_str()
 
             # Obtener todas las reservas futuras con JOIN a users
             result = self.client.table('reservations').select('user_id, users(email, full_name)').gte('date', today).execute()
@@ -1588,8 +1940,6 @@ class AdminDatabaseManager:
     def _send_lock_code_change_notification(self, user_email: str, user_name: str, new_lock_code: str) -> bool:
         """Enviar notificación de cambio de contraseña del candado"""
         try:
-            from email_config import email_manager
-
             if not email_manager.is_configured():
                 print(f"Email not configured, skipping notification for {user_email}")
                 return False
@@ -1805,13 +2155,11 @@ class AdminDatabaseManager:
             target_monday = today - timedelta(days=days_to_monday) + timedelta(weeks=week_offset)
 
             # Calcular rango de fechas (lunes a domingo)
-            week_dates = []
-            for i in range(7):  # 7 días de la semana
-                day_date = target_monday + timedelta(days=i)
-                week_dates.append(day_date)
+            week_dates = [target_monday + timedelta(days=i) for i in range(7)]  # 7 días de la semana
+            week_date_strs = [day_date.strftime('%Y-%m-%d') for day_date in week_dates]
 
-            start_date = week_dates[0].strftime('%Y-%m-%d')
-            end_date = week_dates[6].strftime('%Y-%m-%d')
+            start_date = week_date_strs[0]
+            end_date = week_date_strs[6]
 
             # Obtener reservas de la semana with JOIN to users table
             result = self.client.table('reservations').select('date, hour, user_id, users(full_name, email)').gte(
@@ -1824,56 +2172,37 @@ class AdminDatabaseManager:
             ).lte('date', end_date).execute()
 
             # Organizar datos por fecha y hora
-            reservations_grid = {}
-            maintenance_grid = {}
-            for date in week_dates:
-                date_str = date.strftime('%Y-%m-%d')
-                reservations_grid[date_str] = {}
-                maintenance_grid[date_str] = {}
+            reservations_grid = {date_str: {} for date_str in week_date_strs}
+            maintenance_grid = {date_str: {} for date_str in week_date_strs}
 
             # Llenar el grid con las reservas
+            # (las consultas ya están acotadas a la semana: toda fecha recibida está en el grid)
             for reservation in result.data:
-                date_str = reservation['date']
-                hour = reservation['hour']
-
                 # Get name from JOIN - handle case where user was deleted
-                if reservation.get('users'):
-                    name = reservation['users']['full_name']
-                    email = reservation['users']['email']
-                else:
-                    name = 'Usuario Eliminado'
-                    email = 'N/A'
-
-                if date_str in reservations_grid:
-                    reservations_grid[date_str][hour] = {
-                        'name': name,
-                        'email': email
-                    }
+                user = reservation.get('users')
+                reservations_grid[reservation['date']][reservation['hour']] = {
+                    'name': user['full_name'] if user else 'Usuario Eliminado',
+                    'email': user['email'] if user else 'N/A'
+                }
 
             # Llenar el grid con los mantenimientos
             for maintenance in maintenance_result.data:
-                date_str = maintenance['date']
-                hour = maintenance['hour']
-
-                if date_str in maintenance_grid:
-                    maintenance_grid[date_str][hour] = {
-                        'type': maintenance.get('maintenance_type', 'single_hour'),
-                        'reason': maintenance.get('reason', 'Mantenimiento')
-                    }
+                maintenance_grid[maintenance['date']][maintenance['hour']] = {
+                    'type': maintenance.get('maintenance_type', 'single_hour'),
+                    'reason': maintenance.get('reason', 'Mantenimiento')
+                }
 
             # Add Tennis School slots dynamically if enabled
             if self.get_tennis_school_enabled():
-                for date in week_dates:
-                    date_str = date.strftime('%Y-%m-%d')
+                for date, date_str in zip(week_dates, week_date_strs):
                     # Check if it's Saturday or Sunday
                     if self.is_tennis_school_time(date, 8):  # Just check if it's a weekend
                         # Add hours 8-11
                         for hour in [8, 9, 10, 11]:
-                            if date_str in maintenance_grid:
-                                maintenance_grid[date_str][hour] = {
-                                    'type': 'tennis_school',
-                                    'reason': 'Escuela de Tenis'
-                                }
+                            maintenance_grid[date_str][hour] = {
+                                'type': 'tennis_school',
+                                'reason': 'Escuela de Tenis'
+                            }
 
             return {
                 'week_dates': week_dates,
@@ -2017,25 +2346,22 @@ class AdminDatabaseManager:
             cancellation_rate = round((num_cancellations / max(total_reservations, 1)) * 100, 1)
 
             # Find main cancellation reason
-            reason_counts = {}
+            reason_counts = defaultdict(int)
             for c in cancellations.data:
                 reason = c.get('cancellation_reason', 'Sin motivo') or 'Sin motivo'
                 # Normalize reasons
                 if reason.lower() in ['sin motivo especificado', 'sin motivo', '']:
                     reason = 'Sin motivo especificado'
-                reason_counts[reason] = reason_counts.get(reason, 0) + 1
+                reason_counts[reason] += 1
 
             main_reason = max(reason_counts, key=reason_counts.get) if reason_counts else 'N/A'
             main_reason_count = reason_counts.get(main_reason, 0)
             main_reason_pct = round((main_reason_count / max(num_cancellations, 1)) * 100, 1)
 
             # Find user with most cancellations
-            user_cancellations = {}
+            user_cancellations = defaultdict(int)
             for c in cancellations.data:
-                email = c.get('user_email', 'Desconocido')
-                name = c.get('user_name', 'Desconocido')
-                key = (email, name)
-                user_cancellations[key] = user_cancellations.get(key, 0) + 1
+                user_cancellations[(c.get('user_email', 'Desconocido'), c.get('user_name', 'Desconocido'))] += 1
 
             if user_cancellations:
                 top_user_key = max(user_cancellations, key=user_cancellations.get)
@@ -2272,6 +2598,34 @@ class AdminDatabaseManager:
 
         return True
 
+    def _set_user_active(self, user_email: str, is_active: bool) -> Tuple[Optional[Dict], str]:
+        """
+        Cambiar is_active con un único UPDATE condicional que devuelve la fila
+
+        El filtro por el estado contrario hace que el cambio sea atómico y evita
+        un SELECT previo. users.is_active admite NULL y en SQL NULL no cumple
+        ni "= x" ni "<> x", así que esas filas se incluyen explícitamente.
+        Solo si no se actualiza nada se consulta el usuario para distinguir
+        "no existe" de "ya estaba en ese estado".
+
+        Returns:
+            tuple: (user, error_message) - user es None si no hubo cambio
+        """
+        email = user_email.strip().lower()
+        update_result = self.client.table('users').update({
+            'is_active': is_active
+        }).eq('email', email).or_(
+            f"is_active.neq.{str(is_active).lower()},is_active.is.null"
+        ).execute()
+
+        if update_result.data:
+            return update_result.data[0], None
+
+        exists = self.client.table('users').select('id').eq('email', email).execute()
+        if not exists.data:
+            return None, "Usuario no encontrado"
+        return None, "El usuario ya está activo" if is_active else "El usuario ya está bloqueado"
+
     def block_user(self, user_email: str, admin_username: str) -> Tuple[bool, str]:
         """
         Block a user account, sign out from all sessions, and send notification email
@@ -2281,39 +2635,22 @@ class AdminDatabaseManager:
             admin_username: Admin making the change
         """
         try:
-            # Get user details
-            user_result = self.client.table('users').select('id, full_name, email, is_active').eq(
-                'email', user_email.strip().lower()
-            ).execute()
-
-            if not user_result.data:
-                return False, "Usuario no encontrado"
-
-            user = user_result.data[0]
+            # Block the user (single round trip, returns the updated row)
+            user, error = self._set_user_active(user_email, False)
+            if not user:
+                return False, error
 
-            if not user['is_active']:
-                return False, "El usuario ya está bloqueado"
-
-            # Block the user
-            update_result = self.client.table('users').update({
-                'is_active': False
-            }).eq('id', user['id']).execute()
+            # Sign out user from all active sessions using Admin API
+            try:
+                self.client.auth.admin.sign_out(user['id'])
+                print(f"✅ Signed out user {user['email']} from all sessions")
+            except Exception as e:
+                print(f"⚠️ Warning: Could not sign out user sessions: {e}")
+                # Continue even if sign out fails - user is already blocked
 
-            if update_result.data:
-                # Sign out user from all active sessions using Admin API
-                try:
-                    self.client.auth.admin.sign_out(user['id'])
-                    print(f"✅ Signed out user {user['email']} from all sessions")
-                except Exception as e:
-                    print(f"⚠️ Warning: Could not sign out user sessions: {e}")
-                    # Continue even if sign out fails - user is already blocked
-
-                # Send blocking notification email
-                from email_config import email_manager
-                email_manager.send_account_blocked_notification(user['email'], user['full_name'])
-                return True, f"✅ Usuario bloqueado y desconectado: {user['email']}"
-            else:
-                return False, "Error al bloquear usuario"
+            # Send blocking notification email
+            email_manager.send_account_blocked_notification(user['email'], user['full_name'])
+            return True, f"✅ Usuario bloqueado y desconectado: {user['email']}"
 
         except Exception as e:
             print(f"Error blocking user: {e}")
@@ -2328,31 +2665,14 @@ class AdminDatabaseManager:
             admin_username: Admin making the change
         """
         try:
-            # Get user details
-            user_result = self.client.table('users').select('id, full_name, email, is_active').eq(
-                'email', user_email.strip().lower()
-            ).execute()
-
-            if not user_result.data:
-                return False, "Usuario no encontrado"
-
-            user = user_result.data[0]
-
-            if user['is_active']:
-                return False, "El usuario ya está activo"
-
-            # Unblock the user
-            update_result = self.client.table('users').update({
-                'is_active': True
-            }).eq('id', user['id']).execute()
-
-            if update_result.data:
-                # Send reactivation notification email
-                from email_config import email_manager
-                email_manager.send_account_reactivated_notification(user['email'], user['full_name'])
-                return True, f"✅ Usuario desbloqueado: {user['email']}"
-            else:
-                return False, "Error al desbloquear usuario"
+            # Unblock the user (single round trip, returns the updated row)
+            user, error = self._set_user_active(user_email, True)
+            if not user:
+                return False, error
+
+            # Send reactivation notification email
+            email_manager.send_account_reactivated_notification(user['email'], user['full_name'])
+            return True, f"✅ Usuario desbloqueado: {user['email']}"
 
         except Exception as e:
             print(f"Error unblocking user: {e}")
@@ -2,10 +2,33 @@
 Gestor de Base de Datos Supabase para Sistema de Reservas de Cancha de Tenis
 """
 import streamlit as st
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions, PostgrestAPIError
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from timezone_utils import get_colombia_now, get_colombia_today
+import traceback
+from timezone_utils import get_colombia_now, get_colombia_today_str
+
+# Pool HTTP compartido por todas las consultas: conexiones keep-alive reutilizadas
+# (sin handshake TLS por consulta) y dimensionado para las consultas en paralelo del admin
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+# Segundos; el mismo valor por defecto del cliente PostgREST (las exportaciones pueden tardar)
+HTTP_TIMEOUT = 120
+
+# Códigos con los que PostgREST indica que la función RPC no existe: PGRST202
+# (PostgREST >= 10, HTTP 404) o 42883 undefined_function en versiones anteriores
+MISSING_RPC_ERROR_CODES = ('PGRST202', '42883', '404')
+
+
+def is_missing_rpc_error(error: Exception) -> bool:
+    """
+    Indicar si un error de .rpc() se debe a que la función no existe en la base de datos
+
+    Solo en ese caso es seguro usar el camino paso a paso: ante cualquier otro error
+    (timeout, conexión cortada tras enviar la petición) la función pudo haberse
+    ejecutado ya y repetir la operación la aplicaría dos veces.
+    """
+    return isinstance(error, PostgrestAPIError) and str(error.code) in MISSING_RPC_ERROR_CODES
 
 
 class SupabaseManager:
@@ -15,7 +38,16 @@ class SupabaseManager:
         try:
             self.url = st.secrets["supabase"]["url"]
             self.key = st.secrets["supabase"]["key"]
-            self.client: Client = create_client(self.url, self.key)
+            # Un único cliente HTTP para toda la app (db_manager es una instancia de módulo)
+            self.http_client = httpx.Client(
+                limits=HTTP_POOL_LIMITS,
+                timeout=HTTP_TIMEOUT,
+                follow_redirects=True,
+                http2=True
+            )
+            self.client: Client = create_client(
+                self.url, self.key, options=ClientOptions(httpx_client=self.http_client)
+            )
             self.init_tables()
         except Exception as e:
             st.error(f"Error al conectar con Supabase: {e}")
@@ -54,8 +86,6 @@ class SupabaseManager:
         Returns: (puede_reservar, mensaje_error)
         """
         try:
-            from timezone_utils import get_colombia_now
-
             # Obtener hora y minuto actual en Colombia
             colombia_time = get_colombia_now()
             current_hour = colombia_time.hour
@@ -113,7 +143,25 @@ class SupabaseManager:
         return self.get_user_credits(email) >= required_credits
 
     def use_credits_for_reservation(self, email: str, credits_needed: int, date: str, hour: int) -> bool:
-        """Usar créditos para una reserva"""
+        """Usar créditos para una reserva - descuento y registro atómicos vía RPC"""
+        try:
+            result = self.client.rpc('use_credits_for_reservation', {
+                'p_email': email,
+                'p_credits': credits_needed,
+                'p_date': str(date),
+                'p_hour': hour
+            }).execute()
+            return bool(result.data)
+        except Exception as e:
+            if is_missing_rpc_error(e):
+                print(f"use_credits_for_reservation RPC unavailable, falling back to step-by-step update: {e}")
+                return self._use_credits_for_reservation_fallback(email, credits_needed, date, hour)
+            # El descuento pudo haberse aplicado: no repetirlo por el camino no atómico
+            print(f"Error using credits for reservation (outcome unknown, not retried): {e}")
+            return False
+
+    def _use_credits_for_reservation_fallback(self, email: str, credits_needed: int, date: str, hour: int) -> bool:
+        """Fallback: leer, descontar y registrar en tres llamadas (no atómico)"""
         try:
             # Obtener usuario
             user_result = self.client.table('users').select('id, credits').eq('email', email.strip().lower()).execute()
@@ -427,8 +475,7 @@ class SupabaseManager:
     def cleanup_expired_data(self):
         """Limpiar datos expirados del sistema"""
         try:
-            import datetime
-            now = datetime.datetime.utcnow().isoformat()
+            now = datetime.utcnow().isoformat()
 
             # Limpiar tokens de verificación de email expirados (new table)
             try:
@@ -499,11 +546,9 @@ class SupabaseManager:
             granularity: 'hour', 'day', or 'month'
         """
         try:
-            from datetime import datetime, timedelta
-
             # Default to last 7 days if no dates provided
             if not end_date:
-                end_date = get_colombia_today().strftime('%Y-%m-%d')
+                end_date = get_colombia_today_str()
             if not start_date:
                 start_dt = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=7)
                 start_date = start_dt.strftime('%Y-%m-%d')
@@ -516,14 +561,7 @@ class SupabaseManager:
             print(f"  Start: {start_filter}")
             print(f"  End:   {end_filter}")
 
-            # First, check if we can get ANY records at all (no filters)
-            test_result = self.client.table('user_activity_logs').select('id, created_at').limit(5).execute()
-            print(f"  Test query (no filters): {len(test_result.data)} records")
-            if test_result.data:
-                for rec in test_result.data:
-                    print(f"    - ID {rec['id']}: {rec['created_at']}")
-
-            # Query activity logs with user info
+            # Query activity logs with user info (JOIN embebido: una sola llamada)
             result = self.client.table('user_activity_logs').select(
                 'id, user_id, activity_type, activity_description, created_at, users(full_name, email)'
             ).gte('created_at', start_filter).lte(
@@ -537,17 +575,14 @@ class SupabaseManager:
             return result.data
         except Exception as e:
             print(f"Error getting timeline data: {e}")
-            import traceback
             traceback.print_exc()
             return []
 
     def get_activity_stats(self, start_date: str = None, end_date: str = None) -> Dict:
         """Get aggregated activity statistics"""
         try:
-            from datetime import datetime, timedelta
-
             if not end_date:
-                end_date = get_colombia_today().strftime('%Y-%m-%d')
+                end_date = get_colombia_today_str()
             if not start_date:
                 start_dt = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=30)
                 start_date = start_dt.strftime('%Y-%m-%d')
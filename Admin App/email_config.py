@@ -3,6 +3,7 @@ Configuración y Utilidades de Email para Sistema de Reservas de Cancha de Tenis
 """
 
 import pytz
+import re
 import smtplib
 import ssl
 from email.mime.text import MIMEText
@@ -10,6 +11,7 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from typing import Optional, Tuple
 import streamlit as st
+from timezone_utils import format_date_display
 
 # Configuración de email
 SMTP_SERVER = "smtp.gmail.com"
@@ -40,7 +42,6 @@ class EmailManager:
                 return
 
             # Basic email format validation
-            import re
             if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', self.email_address):
                 self._configured = False
                 st.error("❌ Invalid email address format in secrets")
@@ -77,7 +78,6 @@ class EmailManager:
             return False, "Email service not configured"
 
         # Validate recipient email
-        import re
         if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', to_email):
             return False, "Invalid recipient email format"
 
@@ -367,8 +367,6 @@ class EmailManager:
             cancelled_by: Who cancelled ('user' or 'admin')
             reason: Cancellation reason (optional)
         """
-        from timezone_utils import format_date_display
-
         subject = "🚫 Reserva Cancelada - Sistema de Reservas"
         formatted_date = format_date_display(date)
         hour_display = f"{hour:02d}:00"
@@ -1,11 +1,27 @@
+import time
 import pytz
-from datetime import datetime, date
+from functools import lru_cache
+from datetime import datetime, date, timedelta
 
 # Zona horaria de Colombia
 COLOMBIA_TZ = pytz.timezone('America/Bogota')
 
-# Nombres de días de la semana en español
-SPANISH_DAYS = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+# Colombia no tiene horario de verano: siempre UTC-5
+COLOMBIA_UTC_OFFSET = timedelta(hours=-5)
+
+# Nombres de días de la semana en español (índice = weekday(), 0 = lunes)
+SPANISH_DAYS = ('Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom')
+SPANISH_DAYS_FULL = ('Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo')
+
+# Abreviaturas de meses en español (índice = mes - 1)
+SPANISH_MONTHS = ('Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun',
+                  'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic')
+
+# Segundos que se reutiliza la fecha de hoy ya formateada
+TODAY_STR_CACHE_TTL = 60
+
+# (instante monotónico de expiración, 'YYYY-MM-DD')
+_today_cache = (0.0, '')
 
 def get_colombia_now():
     """Obtener fecha y hora actual en zona horaria de Colombia"""
@@ -15,6 +31,29 @@ def get_colombia_today():
     """Obtener fecha actual en zona horaria de Colombia"""
     return get_colombia_now().date()
 
+def get_colombia_today_str() -> str:
+    """
+    Fecha actual de Colombia en formato 'YYYY-MM-DD', cacheada por el proceso
+
+    Evita recalcular zona horaria y strftime en cada consulta. La entrada
+    expira a los TODAY_STR_CACHE_TTL segundos o a medianoche, lo que ocurra
+    primero, para no devolver nunca la fecha del día anterior.
+    """
+    global _today_cache
+    expires_at, today_str = _today_cache
+    now_mono = time.monotonic()
+    if now_mono < expires_at:
+        return today_str
+
+    now = get_colombia_now()
+    today_str = now.strftime('%Y-%m-%d')
+    next_midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    ttl = min(TODAY_STR_CACHE_TTL, (next_midnight - now).total_seconds())
+    _today_cache = (now_mono + ttl, today_str)
+    return today_str
+
+# Las fechas de reserva se repiten mucho (listados, exportación, calendario): memoizar el formateo
+@lru_cache(maxsize=4096)
 def format_date_display(date_str: str) -> str:
     """
     Formatear fecha en formato legible con día de la semana
@@ -26,10 +65,10 @@ def format_date_display(date_str: str) -> str:
         String en formato 'Día DD/MM/YYYY' (ej: 'Lun 15/01/2025')
     """
     try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-        formatted_date = date_obj.strftime('%d/%m/%Y')
+        # El formato ISO es fijo: fromisoformat (en C) evita el parser genérico de strptime
+        date_obj = date.fromisoformat(date_str)
         day_name = SPANISH_DAYS[date_obj.weekday()]
-        return f"{day_name} {formatted_date}"
+        return f"{day_name} {date_obj.day:02d}/{date_obj.month:02d}/{date_obj.year:04d}"
     except Exception:
         return date_str
 
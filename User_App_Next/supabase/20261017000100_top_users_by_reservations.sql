@@ -0,0 +1,34 @@
+-- Migration: Server-side leaderboard for the admin dashboard
+-- Migration: 20261017000100
+-- Description: Aggregates reservations per user in Postgres so the admin app receives
+-- only the top rows instead of every reservation
+
+CREATE OR REPLACE FUNCTION public.top_users_by_reservations(p_limit INTEGER DEFAULT 10)
+RETURNS TABLE (
+  email TEXT,
+  name TEXT,
+  reservations BIGINT,
+  favorite_dow INTEGER,
+  favorite_hour INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    u.email,
+    u.full_name AS name,
+    COUNT(*) AS reservations,
+    -- ISO day of week: 1 = lunes ... 7 = domingo
+    mode() WITHIN GROUP (ORDER BY EXTRACT(ISODOW FROM r.date)::INTEGER) AS favorite_dow,
+    mode() WITHIN GROUP (ORDER BY r.hour) AS favorite_hour
+  FROM public.reservations r
+  JOIN public.users u ON u.id = r.user_id
+  GROUP BY u.id, u.email, u.full_name
+  ORDER BY reservations DESC
+  LIMIT p_limit;
+$$;
+
+REVOKE ALL ON FUNCTION public.top_users_by_reservations(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.top_users_by_reservations(INTEGER) TO service_role;
+
+COMMENT ON FUNCTION public.top_users_by_reservations IS 'Top users by reservation count with their most frequent weekday (ISO) and hour';
@@ -0,0 +1,26 @@
+-- Migration: Per-user reservation summary in a single query
+-- Migration: 20261017000200
+-- Description: Returns total, upcoming and last reservation date for one user using
+-- conditional aggregates, replacing three separate queries from the admin app
+
+CREATE OR REPLACE FUNCTION public.user_reservation_summary(p_user_id UUID, p_today DATE)
+RETURNS TABLE (
+  total_reservations BIGINT,
+  active_reservations BIGINT,
+  last_reservation DATE
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    COUNT(*) AS total_reservations,
+    COUNT(*) FILTER (WHERE date >= p_today) AS active_reservations,
+    MAX(date) AS last_reservation
+  FROM public.reservations
+  WHERE user_id = p_user_id;
+$$;
+
+REVOKE ALL ON FUNCTION public.user_reservation_summary(UUID, DATE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.user_reservation_summary(UUID, DATE) TO service_role;
+
+COMMENT ON FUNCTION public.user_reservation_summary IS 'Reservation totals for a user; p_today is passed in Colombia time by the caller';
@@ -0,0 +1,12 @@
+-- Migration: Composite index for per-user reservation lookups
+-- Migration: 20261017000300
+-- Description: Lets "latest reservation of a user" (ORDER BY date DESC LIMIT 1) and
+-- per-user date filters be answered from the index without a sort step
+
+CREATE INDEX IF NOT EXISTS idx_reservations_user_id_date_desc
+  ON public.reservations(user_id, date DESC);
+
+-- Verify with:
+--   EXPLAIN SELECT date FROM public.reservations
+--   WHERE user_id = '<uuid>' ORDER BY date DESC LIMIT 1;
+-- The plan should show an Index (Only) Scan on idx_reservations_user_id_date_desc.
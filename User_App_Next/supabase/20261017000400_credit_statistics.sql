@@ -0,0 +1,40 @@
+-- Migration: Credit aggregates computed in Postgres
+-- Migration: 20261017000400
+-- Description: Returns credit balance, issued and used totals as a single row so the
+-- admin app no longer downloads every user and transaction to sum them in Python
+
+CREATE OR REPLACE FUNCTION public.credit_statistics(p_since TIMESTAMPTZ)
+RETURNS TABLE (
+  total_credits BIGINT,
+  users_with_credits BIGINT,
+  credits_issued BIGINT,
+  credits_used_since BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    u.total_credits,
+    u.users_with_credits,
+    t.credits_issued,
+    t.credits_used_since
+  FROM (
+    SELECT
+      COALESCE(SUM(credits), 0) AS total_credits,
+      COUNT(*) FILTER (WHERE COALESCE(credits, 0) > 0) AS users_with_credits
+    FROM public.users
+  ) u
+  CROSS JOIN (
+    SELECT
+      COALESCE(SUM(amount) FILTER (WHERE transaction_type = 'admin_grant'), 0) AS credits_issued,
+      COALESCE(ABS(SUM(amount) FILTER (
+        WHERE transaction_type = 'reservation_use' AND created_at >= p_since
+      )), 0) AS credits_used_since
+    FROM public.credit_transactions
+  ) t;
+$$;
+
+REVOKE ALL ON FUNCTION public.credit_statistics(TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.credit_statistics(TIMESTAMPTZ) TO service_role;
+
+COMMENT ON FUNCTION public.credit_statistics IS 'Credit balance across users, admin-granted total, and credits used since p_since';
@@ -0,0 +1,85 @@
+-- Migration: Atomic admin cancellation of a reservation
+-- Migration: 20261017000500
+-- Description: Refunds the credit, records the refund transaction, deletes the reservation
+-- and stores the cancellation record in a single transaction. Replaces the sequence of
+-- separate calls (and the manual rollback) in the admin app.
+
+CREATE OR REPLACE FUNCTION public.admin_cancel_reservation(
+  p_reservation_id UUID,
+  p_reason TEXT,
+  p_admin TEXT
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_reservation RECORD;
+  v_user RECORD;
+BEGIN
+  -- 1. LOCK THE RESERVATION: a concurrent cancellation waits and then finds nothing
+  SELECT id, user_id, date, hour INTO v_reservation
+  FROM public.reservations
+  WHERE id = p_reservation_id
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object(
+      'success', false,
+      'error_code', 'RESERVATION_NOT_FOUND',
+      'error', 'Reserva no encontrada'
+    );
+  END IF;
+
+  -- 2. LOCK THE USER and refund one credit
+  UPDATE public.users
+  SET credits = COALESCE(credits, 0) + 1
+  WHERE id = v_reservation.user_id
+  RETURNING id, email, full_name, credits INTO v_user;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object(
+      'success', false,
+      'error_code', 'USER_NOT_FOUND',
+      'error', 'Usuario no encontrado'
+    );
+  END IF;
+
+  INSERT INTO public.credit_transactions (user_id, amount, transaction_type, description, admin_user)
+  VALUES (
+    v_user.id,
+    1,
+    'reservation_refund',
+    format('Reembolso por cancelación admin - %s %s:00', v_reservation.date, v_reservation.hour),
+    p_admin
+  );
+
+  -- 3. DELETE THE RESERVATION
+  DELETE FROM public.reservations WHERE id = v_reservation.id;
+
+  -- 4. AUDIT TRAIL
+  INSERT INTO public.reservation_cancellations (
+    original_reservation_id, user_id, user_email, user_name,
+    reservation_date, reservation_hour, cancellation_reason, cancelled_by, credits_refunded
+  )
+  VALUES (
+    v_reservation.id, v_user.id, v_user.email, v_user.full_name,
+    v_reservation.date, v_reservation.hour, p_reason, p_admin, 1
+  );
+
+  RETURN jsonb_build_object(
+    'success', true,
+    'user_id', v_user.id,
+    'user_email', v_user.email,
+    'user_name', v_user.full_name,
+    'date', v_reservation.date,
+    'hour', v_reservation.hour,
+    'new_credits', v_user.credits
+  );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.admin_cancel_reservation(UUID, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.admin_cancel_reservation(UUID, TEXT, TEXT) TO service_role;
+
+COMMENT ON FUNCTION public.admin_cancel_reservation IS 'Admin cancellation: refund credit, delete reservation and log the cancellation atomically';
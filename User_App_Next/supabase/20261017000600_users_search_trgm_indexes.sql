@@ -0,0 +1,13 @@
+-- Migration: Trigram indexes for admin user search
+-- Migration: 20261017000600
+-- Description: The admin app searches users with ILIKE '%term%' on email and full_name.
+-- A leading wildcard cannot use a B-tree index, so every keystroke scanned the whole
+-- users table. pg_trgm GIN indexes support substring ILIKE directly.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm
+  ON public.users USING gin (email gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm
+  ON public.users USING gin (full_name gin_trgm_ops);
@@ -0,0 +1,23 @@
+-- Migration: Server-side hourly reservation counts
+-- Migration: 20261017000700
+-- Description: Groups reservations by hour in Postgres so the admin app receives at most
+-- one row per hour instead of every reservation
+
+CREATE OR REPLACE FUNCTION public.hourly_reservation_stats()
+RETURNS TABLE (
+  hour INTEGER,
+  count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT r.hour, COUNT(*) AS count
+  FROM public.reservations r
+  GROUP BY r.hour
+  ORDER BY r.hour;
+$$;
+
+REVOKE ALL ON FUNCTION public.hourly_reservation_stats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.hourly_reservation_stats() TO service_role;
+
+COMMENT ON FUNCTION public.hourly_reservation_stats IS 'Reservation count per hour of day, ordered by hour';
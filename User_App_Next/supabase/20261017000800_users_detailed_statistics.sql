@@ -0,0 +1,60 @@
+-- Migration: Server-side per-user statistics for the admin users table
+-- Migration: 20261017000800
+-- Description: Aggregates reservations and credit purchases per user in Postgres and
+-- paginates the result, so the admin app no longer scans users, reservations and
+-- credit_transactions to compute totals and favorites in Python
+
+CREATE OR REPLACE FUNCTION public.users_detailed_statistics(
+  p_limit INTEGER DEFAULT NULL,
+  p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+  email TEXT,
+  name TEXT,
+  created_at TIMESTAMPTZ,
+  total_credits_bought BIGINT,
+  total_reservations BIGINT,
+  favorite_dow INTEGER,
+  favorite_hour INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH res AS (
+    SELECT
+      user_id,
+      COUNT(*) AS total_reservations,
+      -- ISO day of week: 1 = lunes ... 7 = domingo
+      mode() WITHIN GROUP (ORDER BY EXTRACT(ISODOW FROM date)::INTEGER) AS favorite_dow,
+      mode() WITHIN GROUP (ORDER BY hour) AS favorite_hour
+    FROM public.reservations
+    GROUP BY user_id
+  ),
+  bought AS (
+    SELECT
+      user_id,
+      SUM(amount) FILTER (WHERE transaction_type IN ('admin_grant', 'purchase', 'bonus')) AS total_credits_bought
+    FROM public.credit_transactions
+    GROUP BY user_id
+  )
+  SELECT
+    u.email,
+    u.full_name AS name,
+    u.created_at,
+    COALESCE(b.total_credits_bought, 0) AS total_credits_bought,
+    COALESCE(r.total_reservations, 0) AS total_reservations,
+    r.favorite_dow,
+    r.favorite_hour
+  FROM public.users u
+  LEFT JOIN res r ON r.user_id = u.id
+  LEFT JOIN bought b ON b.user_id = u.id
+  ORDER BY u.created_at, u.id
+  -- LIMIT NULL devuelve todas las filas
+  LIMIT p_limit
+  OFFSET p_offset;
+$$;
+
+REVOKE ALL ON FUNCTION public.users_detailed_statistics(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.users_detailed_statistics(INTEGER, INTEGER) TO service_role;
+
+COMMENT ON FUNCTION public.users_detailed_statistics IS 'Per-user reservation totals, credits bought and favorite weekday (ISO) and hour, paginated';
@@ -0,0 +1,15 @@
+-- Migration: Covering indexes for "latest code" lookups
+-- Migration: 20261017000900
+-- Description: The admin and user apps read the current lock code and access code with
+-- ORDER BY created_at DESC LIMIT 1; these indexes answer that with an index-only scan
+-- of a single entry instead of scanning and sorting the whole history
+
+CREATE INDEX IF NOT EXISTS idx_lock_code_created_at_desc
+  ON public.lock_code(created_at DESC) INCLUDE (code);
+
+CREATE INDEX IF NOT EXISTS idx_access_codes_created_at_desc
+  ON public.access_codes(created_at DESC) INCLUDE (code);
+
+-- Verify with:
+--   EXPLAIN SELECT code FROM public.lock_code ORDER BY created_at DESC LIMIT 1;
+-- The plan should show an Index Only Scan on idx_lock_code_created_at_desc.
@@ -0,0 +1,37 @@
+-- Migration: Atomic credit deduction for reservations
+-- Migration: 20261017001000
+-- Description: Deducts credits and logs the reservation_use transaction in a single
+-- statement. The conditional UPDATE (credits >= p_credits) removes the read-then-write
+-- race that allowed two concurrent reservations to spend the same credit
+
+CREATE OR REPLACE FUNCTION public.use_credits_for_reservation(
+  p_email TEXT,
+  p_credits INTEGER,
+  p_date DATE,
+  p_hour INTEGER
+)
+RETURNS BOOLEAN
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+  WITH debited AS (
+    UPDATE public.users
+    SET credits = credits - p_credits
+    WHERE email = lower(trim(p_email))
+      AND credits >= p_credits
+    RETURNING id
+  ),
+  logged AS (
+    INSERT INTO public.credit_transactions (user_id, amount, transaction_type, description)
+    SELECT id, -p_credits, 'reservation_use', format('Reserva %s %s:00', p_date, p_hour)
+    FROM debited
+    RETURNING user_id
+  )
+  SELECT EXISTS (SELECT 1 FROM logged);
+$$;
+
+-- Only the service role (admin app) may spend credits on a user's behalf
+REVOKE ALL ON FUNCTION public.use_credits_for_reservation(TEXT, INTEGER, DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.use_credits_for_reservation(TEXT, INTEGER, DATE, INTEGER) TO service_role;
+
+COMMENT ON FUNCTION public.use_credits_for_reservation IS 'Atomically deducts p_credits from the user and records a reservation_use transaction; false if the user is missing or lacks credits';
@@ -0,0 +1,25 @@
+-- Migration: Pre-formatted users view for the admin Excel export
+-- Migration: 20261017001100
+-- Description: Emits the export's display values (Sí/No flags, registration date in
+-- Colombia time) from Postgres so the admin app maps rows to columns without per-row
+-- formatting
+
+CREATE OR REPLACE VIEW public.users_export_v
+WITH (security_invoker = true)
+AS
+SELECT
+  u.id,
+  u.full_name,
+  u.email,
+  COALESCE(u.credits, 0) AS credits,
+  CASE WHEN u.is_vip THEN 'Sí' ELSE 'No' END AS is_vip_label,
+  CASE WHEN u.first_login_completed THEN 'Sí' ELSE 'No' END AS first_login_label,
+  to_char(u.created_at AT TIME ZONE 'America/Bogota', 'DD/MM/YYYY HH24:MI') AS created_at_display,
+  u.created_at
+FROM public.users u;
+
+-- Only the service role (admin app) reads the export view
+REVOKE ALL ON public.users_export_v FROM PUBLIC, anon, authenticated;
+GRANT SELECT ON public.users_export_v TO service_role;
+
+COMMENT ON VIEW public.users_export_v IS 'Users with export-ready labels and Colombia-time registration date (DD/MM/YYYY HH24:MI)';
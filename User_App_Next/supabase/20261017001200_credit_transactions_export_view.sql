@@ -0,0 +1,33 @@
+-- Migration: Pre-formatted credit transactions view for the admin Excel export
+-- Migration: 20261017001200
+-- Description: Translates transaction types to their Spanish labels with CASE and emits
+-- user, admin and Colombia-time date display values, so the admin app maps rows to
+-- columns without per-row lookups or formatting
+
+CREATE OR REPLACE VIEW public.credit_transactions_export_v
+WITH (security_invoker = true)
+AS
+SELECT
+  t.id,
+  COALESCE(u.full_name, 'Usuario eliminado') AS user_name,
+  COALESCE(u.email, 'N/A') AS user_email,
+  t.amount,
+  CASE t.transaction_type
+    WHEN 'admin_grant' THEN 'Otorgado por Admin'
+    WHEN 'admin_deduct' THEN 'Deducido por Admin'
+    WHEN 'reservation_use' THEN 'Usado en Reserva'
+    WHEN 'reservation_refund' THEN 'Reembolso de Reserva'
+    ELSE t.transaction_type
+  END AS transaction_type_label,
+  t.description,
+  COALESCE(NULLIF(t.admin_user, ''), 'Sistema') AS admin_user_display,
+  to_char(t.created_at AT TIME ZONE 'America/Bogota', 'DD/MM/YYYY HH24:MI') AS created_at_display,
+  t.created_at
+FROM public.credit_transactions t
+LEFT JOIN public.users u ON u.id = t.user_id;
+
+-- Only the service role (admin app) reads the export view
+REVOKE ALL ON public.credit_transactions_export_v FROM PUBLIC, anon, authenticated;
+GRANT SELECT ON public.credit_transactions_export_v TO service_role;
+
+COMMENT ON VIEW public.credit_transactions_export_v IS 'Credit transactions with Spanish type labels and Colombia-time date (DD/MM/YYYY HH24:MI) for export';
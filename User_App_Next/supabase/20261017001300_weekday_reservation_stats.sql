@@ -0,0 +1,23 @@
+-- Migration: Server-side reservation counts by day of week
+-- Migration: 20261017001300
+-- Description: Groups reservations by ISO day of week in Postgres so the admin app receives
+-- at most seven rows instead of every reservation date
+
+CREATE OR REPLACE FUNCTION public.weekday_reservation_stats()
+RETURNS TABLE (
+  dow INTEGER,
+  count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT EXTRACT(ISODOW FROM r.date)::INTEGER AS dow, COUNT(*) AS count
+  FROM public.reservations r
+  GROUP BY 1
+  ORDER BY 1;
+$$;
+
+REVOKE ALL ON FUNCTION public.weekday_reservation_stats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.weekday_reservation_stats() TO service_role;
+
+COMMENT ON FUNCTION public.weekday_reservation_stats IS 'Reservation count per ISO day of week (1 = Monday ... 7 = Sunday), ordered by day';
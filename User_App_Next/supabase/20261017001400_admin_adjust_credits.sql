@@ -0,0 +1,39 @@
+-- Migration: Atomic admin credit adjustments
+-- Migration: 20261017001400
+-- Description: Applies an admin grant or deduction and logs it in credit_transactions in a
+-- single statement. Replaces the select, update and insert round trips of the admin app and
+-- the read-then-write race on users.credits; deductions never leave a negative balance
+
+CREATE OR REPLACE FUNCTION public.admin_adjust_credits(
+  p_email TEXT,
+  p_amount INTEGER,
+  p_transaction_type TEXT,
+  p_description TEXT,
+  p_admin_user TEXT
+)
+RETURNS BOOLEAN
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+  WITH adjusted AS (
+    UPDATE public.users
+    SET credits = COALESCE(credits, 0) + p_amount
+    WHERE email = lower(trim(p_email))
+      AND p_transaction_type IN ('admin_grant', 'admin_deduct')
+      AND COALESCE(credits, 0) + p_amount >= 0
+    RETURNING id
+  ),
+  logged AS (
+    INSERT INTO public.credit_transactions (user_id, amount, transaction_type, description, admin_user)
+    SELECT id, p_amount, p_transaction_type, p_description, p_admin_user
+    FROM adjusted
+    RETURNING user_id
+  )
+  SELECT EXISTS (SELECT 1 FROM logged);
+$$;
+
+-- Only the service role (admin app) may adjust credits
+REVOKE ALL ON FUNCTION public.admin_adjust_credits(TEXT, INTEGER, TEXT, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.admin_adjust_credits(TEXT, INTEGER, TEXT, TEXT, TEXT) TO service_role;
+
+COMMENT ON FUNCTION public.admin_adjust_credits IS 'Atomically adds p_amount (negative to deduct) to the user credits and records the admin transaction; false if the user is missing or the balance would go negative';